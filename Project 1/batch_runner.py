@@ -0,0 +1,131 @@
+"""Runs any chromatic number algorithm for all the graphs in a directory,
+solving several graphs at the same time, each one in its own process.
+Stores the same results as the testing code of exhaustive_search.py and
+greedy_heuristic.py: the chromatic number and colouring solution of each
+graph in the graph corpus file and a pickle file with the empirical 
+complexity data of all the graphs."""
+
+from multiprocessing.connection import wait
+import multiprocessing
+import os
+import pickle
+import time
+
+from bitset_graph import BitsetGraph
+from graph_corpus import CORPUS_FILE, GraphCorpus, save_solutions
+from instrumentation import count_operations
+
+
+def solve_graph(func, corpus_file, k, conn):
+    """Runs func for instance k of the corpus and sends the solution and the
+    empirical complexity data through the connection conn.
+    Meant to run in its own process."""
+
+    corpus = GraphCorpus(corpus_file)
+    if func.__name__.endswith('_bitset'):
+        graph = BitsetGraph.from_adj_list(corpus.adj_list(k))
+    elif func.__name__.endswith('_csr'):
+        graph = corpus.graph(k)
+    else:
+        graph = corpus.adj_list(k)
+
+    t_start = time.time()
+    chromatic_number, best_colours = func(graph)
+    t_end = time.time()
+    elapsed_time = t_end - t_start
+
+    if elapsed_time < 1e-3:
+        n_runs = 1000
+        t_start = time.time()
+        for _ in range(n_runs):
+            chromatic_number, best_colours = func(graph)
+        t_end = time.time()
+        elapsed_time = (t_end - t_start) / n_runs
+
+    _, counters = count_operations(func, graph)
+    analysis = {**counters.as_dict(), 'e_time': elapsed_time}
+
+    conn.send((chromatic_number, best_colours, analysis))
+    conn.close()
+
+
+def run_batch(func, solver, analysis_file, corpus_file=CORPUS_FILE,
+              workers=None, timeout=None, max_nodes=None):
+    """Runs func for all the graphs in the corpus with at most workers
+    graphs at the same time (os.cpu_count() if not given).
+    A graph taking more than timeout seconds is cancelled and left out of
+    the results. Saves the solutions in the corpus under the name solver and
+    the empirical complexity data in analysis_file, and returns the latter."""
+
+    workers = workers or os.cpu_count()
+    corpus = GraphCorpus(corpus_file)
+    instances = corpus.instances(max_nodes)
+
+    print(f'Running {func.__name__} for all graphs, ' +
+          f'using {workers} processes.\n')
+
+    empirical_analysis = {}
+    solutions = {}
+    running = {}  # connection -> (process, instance, deadline)
+    try:
+        while instances or running:
+            # Start new graphs while there are free workers.
+            while instances and len(running) < workers:
+                k = instances.pop(0)
+                recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(
+                    target=solve_graph,
+                    args=(func, corpus_file, k, send_conn))
+                process.start()
+                send_conn.close()
+                deadline = time.monotonic() + timeout if timeout else None
+                running[recv_conn] = (process, k, deadline)
+
+            # Wait for a result or until the next graph runs out of time.
+            deadlines = [deadline for _, _, deadline in running.values()
+                         if deadline is not None]
+            wait_time = None
+            if deadlines:
+                wait_time = max(0, min(deadlines) - time.monotonic())
+
+            for conn in wait(list(running), wait_time):
+                process, k, _ = running.pop(conn)
+                try:
+                    chromatic_number, best_colours, analysis = conn.recv()
+                except EOFError:
+                    print(f'Graph {corpus.name(k)}: FAILED')
+                    continue
+                finally:
+                    process.join()
+
+                print(f'Graph {corpus.name(k)}: DONE in ' +
+                      f'{1000*analysis["e_time"]:.3f} ms')
+                empirical_analysis[f'{corpus.name(k)}.pkl'] = analysis
+                solutions[k] = (chromatic_number, best_colours)
+
+            for conn, (process, k, deadline) in list(running.items()):
+                if deadline is not None and time.monotonic() >= deadline:
+                    process.terminate()
+                    process.join()
+                    del running[conn]
+                    print(f'Graph {corpus.name(k)}: TIMED OUT')
+
+    except KeyboardInterrupt:
+        print(' CANCELLED')
+        for process, _, _ in running.values():
+            process.terminate()
+            process.join()
+
+    save_solutions(solver, solutions, corpus_file)
+    with open(analysis_file, 'wb') as f:
+        pickle.dump(empirical_analysis, f)
+    print('\nUploaded complexity results to file.')
+
+    return empirical_analysis
+
+
+if __name__ == '__main__':
+    from exhaustive_search import chromatic_number_exhaustive_v5
+
+    run_batch(chromatic_number_exhaustive_v5, 'exhaustive_v5',
+              './results/exhaustive_analysis_v5.pkl', timeout=60)
@@ -0,0 +1,268 @@
+"""Benchmark the chromatic number algorithms on the graphs of the corpus.
+
+Every registered solver is run on every graph with warm-up runs first and
+then several timed samples with time.perf_counter_ns, each sample repeating
+the solver enough times to last at least MIN_SAMPLE_NS. The time needed to
+load the graph from the corpus is measured apart from the solving time, and
+the operation counts and phase times are taken from a separate untimed run
+with counters (see instrumentation.py).
+Results (median and interquartile range of the time per run) are saved in
+a versioned JSON file, which empirical_analysis.py can load.
+
+If a baseline results file is given, the script fails (exit status 1) when
+a solver got slower than in the baseline by more than the allowed margin,
+on average over the graphs:
+
+    python benchmark.py --solvers greedy exhaustive_v5 --save-baseline
+    ...
+    python benchmark.py --solvers greedy exhaustive_v5 --baseline
+"""
+
+import argparse
+import datetime
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+from bitset_graph import BitsetGraph
+import decomposition
+import exhaustive_search
+from graph_corpus import GraphCorpus
+import greedy_heuristic
+from instrumentation import count_operations
+import sat_colouring
+
+
+BENCHMARK_FORMAT = 'chromatic-number-benchmark'
+BENCHMARK_VERSION = 2
+RESULTS_FILE = './results/benchmark.json'
+BASELINE_FILE = './results/benchmark_baseline.json'
+
+N_WARM_UP = 2
+MIN_SAMPLE_NS = 1_000_000
+MIN_SAMPLES = 5
+MAX_SAMPLES = 25
+# Time spent on the samples of each graph, once there are MIN_SAMPLES.
+TIME_BUDGET_NS = 500_000_000
+
+
+########## SOLVER REGISTRY #############
+
+# name -> (function, graph type, max_nodes)
+SOLVERS = {}
+
+
+def register_solver(name, func, graph_type='adj_list', max_nodes=None):
+    """Add a solver to the benchmark. graph_type is the representation the
+    solver takes (adj_list, bitset or csr) and max_nodes the size of the
+    largest graph to run it on (all if None)."""
+    SOLVERS[name] = (func, graph_type, max_nodes)
+
+
+register_solver('exhaustive_v3', exhaustive_search.chromatic_number_exhaustive_v3,
+                max_nodes=10)
+register_solver('exhaustive_v4', exhaustive_search.chromatic_number_exhaustive_v4)
+register_solver('exhaustive_v4_bitset',
+                exhaustive_search.chromatic_number_exhaustive_v4_bitset,
+                graph_type='bitset')
+register_solver('exhaustive_v5', exhaustive_search.chromatic_number_exhaustive_v5)
+register_solver('decomposed_v5', decomposition.chromatic_number_decomposed)
+register_solver('exhaustive_ie', exhaustive_search.chromatic_number_exhaustive_ie)
+register_solver('exhaustive_vec', exhaustive_search.chromatic_number_exhaustive_vec,
+                max_nodes=12)
+register_solver('sat', sat_colouring.chromatic_number_sat)
+register_solver('greedy', greedy_heuristic.chromatic_number_greedy)
+register_solver('greedy_bitset', greedy_heuristic.chromatic_number_greedy_bitset,
+                graph_type='bitset')
+register_solver('greedy_csr', greedy_heuristic.chromatic_number_greedy_csr,
+                graph_type='csr')
+register_solver('greedy_portfolio',
+                greedy_heuristic.chromatic_number_greedy_portfolio)
+
+
+def load_graph(corpus, k, graph_type):
+    """Returns instance k of the corpus in the representation graph_type."""
+    if graph_type == 'csr':
+        return corpus.graph(k)
+    adj_list = corpus.adj_list(k)
+    if graph_type == 'bitset':
+        return BitsetGraph.from_adj_list(adj_list)
+    return adj_list
+
+
+########## TIMING #############
+
+def time_func(func, graph, n_warm_up=N_WARM_UP, min_sample_ns=MIN_SAMPLE_NS,
+              min_samples=MIN_SAMPLES, max_samples=MAX_SAMPLES,
+              time_budget_ns=TIME_BUDGET_NS):
+    """Returns the result of func for the graph, the times of one run (in ns)
+    in each timed sample and the number of runs per sample."""
+    # After the warm-up runs, the number of runs per sample is doubled until
+    # a sample lasts at least min_sample_ns, so samples of fast solvers are
+    # long enough for the timer resolution.
+
+    for _ in range(n_warm_up):
+        result = func(graph)
+
+    n_runs = 1
+    while True:
+        t_start = time.perf_counter_ns()
+        for _ in range(n_runs):
+            result = func(graph)
+        sample_ns = time.perf_counter_ns() - t_start
+        if sample_ns >= min_sample_ns:
+            break
+        n_runs *= 2
+
+    samples = [sample_ns / n_runs]
+    t_samples = time.perf_counter_ns()
+    while len(samples) < max_samples:
+        if (len(samples) >= min_samples
+                and time.perf_counter_ns() - t_samples >= time_budget_ns):
+            break
+        t_start = time.perf_counter_ns()
+        for _ in range(n_runs):
+            func(graph)
+        samples.append((time.perf_counter_ns() - t_start) / n_runs)
+
+    return result, samples, n_runs
+
+
+def summarise(samples):
+    """Returns the median, quartiles and interquartile range of the times."""
+    q1, median, q3 = np.percentile(samples, (25, 50, 75))
+    return {'median_ns': float(median),
+            'q1_ns': float(q1),
+            'q3_ns': float(q3),
+            'iqr_ns': float(q3 - q1),
+            'min_ns': float(min(samples))}
+
+
+########## BENCHMARK #############
+
+def run_benchmark(solvers=None, max_nodes=None, corpus_file=None,
+                  **timing_options):
+    """Runs the solvers (all the registered ones if not given) for the
+    graphs in the corpus and returns the results in the format of the
+    results file."""
+
+    corpus = GraphCorpus(corpus_file) if corpus_file else GraphCorpus()
+    solvers = solvers or list(SOLVERS)
+    results = {}
+
+    for solver in solvers:
+        func, graph_type, solver_max_nodes = SOLVERS[solver]
+        if max_nodes is not None:
+            solver_max_nodes = min(max_nodes, solver_max_nodes or max_nodes)
+        print(f'\nBenchmarking {solver}.')
+        results[solver] = {}
+
+        for k in corpus.instances(solver_max_nodes):
+            name = corpus.name(k)
+            t_start = time.perf_counter_ns()
+            graph = load_graph(corpus, k, graph_type)
+            load_ns = time.perf_counter_ns() - t_start
+
+            (chromatic_number, _), samples, n_runs = time_func(
+                func, graph, **timing_options)
+            _, counters = count_operations(func, graph)
+            result = summarise(samples)
+            result.update({'load_ns': load_ns,
+                           'n_samples': len(samples),
+                           'n_runs': n_runs,
+                           'chromatic_number': int(chromatic_number),
+                           'counters': counters.counts(),
+                           'phase_ns': {phase: 1e9 * seconds for phase, seconds
+                                        in counters.phase_times.items()}})
+            results[solver][name] = result
+
+            print(f'Graph {name}: median {result["median_ns"]/1e6:.4f} ms, '
+                  f'IQR {result["iqr_ns"]/1e6:.4f} ms '
+                  f'({len(samples)} samples of {n_runs} runs)')
+
+    return {'format': BENCHMARK_FORMAT,
+            'version': BENCHMARK_VERSION,
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'environment': {'python': platform.python_version(),
+                            'numpy': np.__version__,
+                            'platform': platform.platform(),
+                            'processor': platform.processor()},
+            'results': results}
+
+
+def save_results(benchmark, file=RESULTS_FILE):
+    """Writes the benchmark results to a JSON file."""
+    with open(file, 'w') as f:
+        json.dump(benchmark, f, indent=4)
+
+
+def load_results(file=RESULTS_FILE):
+    """Reads a benchmark results file, checking its format and version."""
+    with open(file) as f:
+        benchmark = json.load(f)
+    if benchmark.get('format') != BENCHMARK_FORMAT:
+        raise ValueError(f'{file} is not a benchmark results file')
+    if benchmark.get('version') != BENCHMARK_VERSION:
+        raise ValueError(f'{file} has version {benchmark.get("version")}, '
+                         f'expected {BENCHMARK_VERSION}')
+    return benchmark
+
+
+def check_regression(benchmark, baseline, margin=0.1):
+    """Returns the (solver, slowdown) of the solvers slower than in the 
+    baseline by more than margin, where slowdown is the geometric mean over
+    the graphs in both of the ratio of the median times (1.2 means 20%
+    slower)."""
+    # A single graph can be off by more than margin just from the noise of
+    # the machine, so the slowdown of a solver is averaged over all graphs.
+
+    regressions = []
+    for solver, results in benchmark['results'].items():
+        baseline_results = baseline['results'].get(solver, {})
+        ratios = [result['median_ns'] / baseline_results[name]['median_ns']
+                  for name, result in results.items()
+                  if name in baseline_results]
+        if not ratios:
+            continue
+        slowdown = float(np.exp(np.mean(np.log(ratios))))
+        if slowdown > 1 + margin:
+            regressions.append((solver, slowdown))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--solvers', nargs='+', choices=list(SOLVERS),
+                        help='solvers to run (default: all)')
+    parser.add_argument('--max-nodes', type=int,
+                        help='size of the largest graph to run')
+    parser.add_argument('--output', default=RESULTS_FILE,
+                        help='results file to write')
+    parser.add_argument('--baseline', nargs='?', const=BASELINE_FILE,
+                        help='results file to check for regressions against '
+                             f'(default: {BASELINE_FILE})')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help=f'also save the results as {BASELINE_FILE}')
+    parser.add_argument('--margin', type=float, default=0.1,
+                        help='allowed slowdown of a solver versus the '
+                             'baseline (0.1 is 10%%)')
+    args = parser.parse_args()
+
+    benchmark = run_benchmark(args.solvers, args.max_nodes)
+    save_results(benchmark, args.output)
+    print(f'\nUploaded benchmark results to {args.output}.')
+    if args.save_baseline:
+        save_results(benchmark, BASELINE_FILE)
+
+    if args.baseline:
+        regressions = check_regression(benchmark, load_results(args.baseline),
+                                       args.margin)
+        for solver, slowdown in regressions:
+            print(f'REGRESSION: {solver} is {100*(slowdown - 1):.1f}% slower '
+                  f'than in the baseline')
+        if regressions:
+            sys.exit(1)
+        print('No regressions against the baseline.')
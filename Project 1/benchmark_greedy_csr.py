@@ -0,0 +1,74 @@
+"""Measures the execution time of the greedy heuristic on large random graphs
+(10^3 to 10^6 nodes), comparing the CSR version with the adjacency list
+version for the sizes where the latter can still be run.
+Saves the times in a pickle file."""
+
+import os
+import pickle
+import time
+
+import numpy as np
+
+from csr_graph import CSRGraph
+from greedy_heuristic import chromatic_number_greedy, chromatic_number_greedy_csr
+
+
+SIZES = (10**3, 10**4, 10**5, 10**6)
+AVERAGE_DEGREE = 10
+# Largest graph for which the adjacency list version is run.
+MAX_NODES_ADJ_LIST = 10**5
+
+
+def random_sparse_graph(n_nodes, average_degree, seed=0):
+    """Returns a random CSRGraph with n_nodes nodes and about
+    n_nodes*average_degree/2 edges, chosen uniformly at random."""
+
+    rng = np.random.default_rng(seed)
+    n_edges = n_nodes * average_degree // 2
+    edges = rng.integers(0, n_nodes, size=(n_edges, 2))
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    # Store each edge once, as (smaller node, larger node).
+    edges = np.unique(np.sort(edges, axis=1), axis=0)
+    return CSRGraph.from_edges(n_nodes, edges)
+
+
+def time_func(func, graph):
+    """Returns the result of func for the graph and its execution time."""
+    t_start = time.perf_counter()
+    result = func(graph)
+    t_end = time.perf_counter()
+    return result, t_end - t_start
+
+
+if __name__ == '__main__':
+    benchmark = {}
+
+    print(f'{"nodes":>9} {"edges":>9} {"colours":>8} ' +
+          f'{"CSR (s)":>10} {"adj list (s)":>13}')
+    for n_nodes in SIZES:
+        graph = random_sparse_graph(n_nodes, AVERAGE_DEGREE)
+        n_edges = len(graph.indices) // 2
+
+        (chromatic_number, _), csr_time = time_func(
+            chromatic_number_greedy_csr, graph)
+        benchmark[n_nodes] = {'n_edges': n_edges,
+                              'chromatic_number': chromatic_number,
+                              'csr_time': csr_time}
+
+        adj_list_time = None
+        if n_nodes <= MAX_NODES_ADJ_LIST:
+            (adj_chromatic_number, _), adj_list_time = time_func(
+                chromatic_number_greedy, graph.to_adj_list())
+            assert adj_chromatic_number == chromatic_number
+            benchmark[n_nodes]['adj_list_time'] = adj_list_time
+
+        adj_list_str = (f'{adj_list_time:13.3f}' if adj_list_time is not None
+                        else f'{"-":>13}')
+        print(f'{n_nodes:9d} {n_edges:9d} {chromatic_number:8d} ' +
+              f'{csr_time:10.3f} {adj_list_str}')
+
+    if not os.path.exists('./results'):
+        os.makedirs('./results')
+    with open('./results/greedy_csr_benchmark.pkl', 'wb') as f:
+        pickle.dump(benchmark, f)
+    print('\nUploaded benchmark results to file.')
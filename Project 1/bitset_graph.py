@@ -0,0 +1,54 @@
+"""Compact graph representation where the neighbours of each node are
+stored as the bits of a single integer, so that checking a node against a
+whole set of nodes takes a single AND operation."""
+
+
+class BitsetGraph:
+    """
+    An undirected graph with nodes 0..n_nodes-1 stored as bitmasks.
+
+    Bit j of neighbours[i] is set if nodes i and j are adjacent. A set of
+    nodes (for example, all the nodes with a given colour) is stored in the
+    same way, so node i conflicts with a set of nodes if
+    neighbours[i] & nodes_mask != 0.
+    """
+
+    def __init__(self, neighbours):
+        """
+        Parameters
+        ----------
+        neighbours : list with the neighbours bitmask of each node
+        """
+        self.neighbours = neighbours
+        self.n_nodes = len(neighbours)
+
+    @classmethod
+    def from_adj_list(cls, adj_list):
+        """Build the graph from the adjacency list (dict of lists) stored
+        in the graph pickle files."""
+        neighbours = [0] * len(adj_list)
+        for node in adj_list:
+            for neighbour in adj_list[node]:
+                neighbours[node] |= 1 << neighbour
+        return cls(neighbours)
+
+    def to_adj_list(self):
+        """Return the adjacency list (dict of lists) of the graph."""
+        return {node: [neighbour for neighbour in range(self.n_nodes)
+                       if self.neighbours[node] >> neighbour & 1]
+                for node in range(self.n_nodes)}
+
+    def __len__(self):
+        return self.n_nodes
+
+    def degree(self, node):
+        """Return the number of neighbours of node."""
+        return self.neighbours[node].bit_count()
+
+    def colour_classes(self, colour_config):
+        """Return a list with the bitmask of the nodes with each colour of
+        the colour configuration."""
+        classes = [0] * (max(colour_config, default=-1) + 1)
+        for node, colour in enumerate(colour_config):
+            classes[colour] |= 1 << node
+        return classes
@@ -0,0 +1,70 @@
+"""Compressed sparse row (CSR) graph representation, where the neighbours of
+all the nodes are stored one after the other in a single array, so that
+graphs with millions of edges fit in memory and can be processed with
+NumPy instead of Python dicts and lists."""
+
+import numpy as np
+
+
+class CSRGraph:
+    """
+    An undirected graph with nodes 0..n_nodes-1 stored in CSR format.
+
+    The neighbours of node i are indices[indptr[i]:indptr[i+1]], so the
+    degree of node i is indptr[i+1] - indptr[i]. Every edge is stored twice,
+    once for each of its end nodes.
+    """
+
+    def __init__(self, indptr, indices):
+        """
+        Parameters
+        ----------
+        indptr : array of n_nodes+1 offsets into indices
+        indices : array with the neighbours of all the nodes
+        """
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.indices = np.asarray(indices, dtype=np.int64)
+        self.n_nodes = len(self.indptr) - 1
+
+    @classmethod
+    def from_adj_list(cls, adj_list):
+        """Build the graph from the adjacency list (dict of lists) stored
+        in the graph pickle files."""
+        n_nodes = len(adj_list)
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        for node in adj_list:
+            indptr[node + 1] = len(adj_list[node])
+        np.cumsum(indptr, out=indptr)
+        indices = np.empty(indptr[-1], dtype=np.int64)
+        for node in adj_list:
+            indices[indptr[node]:indptr[node + 1]] = adj_list[node]
+        return cls(indptr, indices)
+
+    @classmethod
+    def from_edges(cls, n_nodes, edges):
+        """Build the graph from an array of shape (n_edges, 2) with each
+        edge stored once."""
+        edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        # Both directions of each edge, sorted by source node.
+        sources = np.concatenate((edges[:, 0], edges[:, 1]))
+        targets = np.concatenate((edges[:, 1], edges[:, 0]))
+        order = np.argsort(sources, kind='stable')
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(sources, minlength=n_nodes), out=indptr[1:])
+        return cls(indptr, targets[order])
+
+    def to_adj_list(self):
+        """Return the adjacency list (dict of lists) of the graph."""
+        return {node: self.neighbours(node).tolist()
+                for node in range(self.n_nodes)}
+
+    def __len__(self):
+        return self.n_nodes
+
+    def neighbours(self, node):
+        """Return the array of neighbours of node."""
+        return self.indices[self.indptr[node]:self.indptr[node + 1]]
+
+    def degrees(self):
+        """Return the array with the degree of every node."""
+        return np.diff(self.indptr)
@@ -4,9 +4,12 @@ empirical analysis."""
 
 import matplotlib.pyplot as plt
 import numpy as np
+import os
 import pickle
 from scipy.optimize import curve_fit
 
+from benchmark import load_results, RESULTS_FILE
+
 
 def organize_results_exhaustive(results):
     n_nodes = {'p25': [], 'p50': [], 'p75': []}
@@ -184,6 +187,77 @@ def plot_analysis_v3():
     plt.show()
 
 
+def plot_analysis_compare(versions=('v2', 'v3', 'v4', 'v5'), p_str='p50'):
+    """Plot the results of several exhaustive search algorithms side by side,
+    for the graphs with the given edge percentage."""
+
+    _, ax_configs = plt.subplots()
+    _, ax_time = plt.subplots()
+    for version in versions:
+        results_file = f'./results/exhaustive_analysis_{version}.pkl'
+        if not os.path.exists(results_file):
+            continue
+        with open(results_file, 'rb') as f:
+            results = pickle.load(f)
+        n_nodes, e_time, n_configs, _ = organize_results_exhaustive(results)
+        ax_configs.scatter(n_nodes[p_str], n_configs[p_str], 
+                           label=f'exhaustive_{version}')
+        ax_time.scatter(n_nodes[p_str], e_time[p_str], 
+                        label=f'exhaustive_{version}')
+
+    for ax, ylabel, name in ((ax_configs, 'Number of configurations tested', 
+                              'n_configs'),
+                             (ax_time, 'Execution time (s)', 'e_time')):
+        ax.set_yscale('log')
+        ax.set_xlabel('Number of nodes')
+        ax.set_title(f'p = 0.{p_str[-2:]}')
+        ax.set_ylabel(ylabel)
+        ax.legend()
+        ax.figure.savefig(f'./results/exhaustive_compare_{name}.png')
+    plt.show()
+
+
+def load_benchmark(solver, file=RESULTS_FILE):
+    """Returns the results of solver in a benchmark results file (see 
+    benchmark.py) in the same format as the complexity data pickle files,
+    with the median time as e_time and its interquartile range as 
+    e_time_iqr."""
+
+    benchmark = load_results(file)
+    results = {}
+    for name, result in benchmark['results'][solver].items():
+        results[f'{name}.pkl'] = {'e_time': result['median_ns'] / 1e9,
+                                  'e_time_iqr': result['iqr_ns'] / 1e9,
+                                  **result['counters']}
+    return results
+
+
+def plot_benchmark(solvers, p_str='p50', file=RESULTS_FILE):
+    """Plot the median execution time of several solvers in a benchmark 
+    results file, with error bars from the first to the third quartile, for
+    the graphs with the given edge percentage."""
+
+    benchmark = load_results(file)
+    _, ax = plt.subplots()
+    for solver in solvers:
+        results = benchmark['results'][solver]
+        names = sorted(name for name in results if name.endswith(p_str))
+        n_nodes = [int(name[:2]) for name in names]
+        median = np.array([results[name]['median_ns'] for name in names])
+        q1 = np.array([results[name]['q1_ns'] for name in names])
+        q3 = np.array([results[name]['q3_ns'] for name in names])
+        ax.errorbar(n_nodes, median / 1e9, 
+                    yerr=(median - q1, q3 - median) / np.array(1e9),
+                    fmt='o', capsize=2, label=solver)
+    ax.set_yscale('log')
+    ax.set_xlabel('Number of nodes')
+    ax.set_title(f'p = 0.{p_str[-2:]}')
+    ax.set_ylabel('Median execution time (s)')
+    ax.legend()
+    plt.savefig(f'./results/benchmark_e_time_{p_str}.png')
+    plt.show()
+
+
 def organize_results_greedy(results):
     n_nodes = {'p25': [], 'p50': [], 'p75': []}
     e_time = {'p25': [], 'p50': [], 'p75': []}
@@ -265,4 +339,6 @@ def plot_analysis_greedy():
 
 #plot_analysis_v2()
 #plot_analysis_v3()
+#plot_analysis_compare()
+#plot_benchmark(('greedy', 'exhaustive_v4', 'exhaustive_v5'))
 plot_analysis_greedy()
\ No newline at end of file
@@ -3,47 +3,25 @@ calculate the average precision of the greedy algorithm."""
 
 from functools import wraps
 import numpy as np
-import os
-import pickle
 
+from graph_corpus import GraphCorpus
 
-exact_results = np.zeros((3, 13))
-for file in sorted(os.listdir('./results/exhaustive_v3')):
-    if file[-4:] != '.pkl':
-        continue
-    n_nodes = int(file[:2])
-    if 'p25' in file:
-        row = 0
-    elif 'p50' in file:
-        row = 1
-    elif 'p75' in file:
-        row = 2
-    with open(f'./results/exhaustive_v3/{file}', 'rb') as f:
-        _ = pickle.load(f)
-        _ = pickle.load(f)
-        chromatic_number = pickle.load(f)
-    
-    exact_results[row][n_nodes-2] = chromatic_number
 
+EDGE_PERCENTAGES = (0.25, 0.50, 0.75)
+
+corpus = GraphCorpus()
+exact_results = np.zeros((3, 13))
 greedy_results = np.zeros((3, 13))
-for file in sorted(os.listdir('./results/greedy')):
-    n_nodes = int(file[:2])
-    if n_nodes > 14:
-        break
-    if file[-4:] != '.pkl':
+for k in corpus.instances(max_nodes=14):
+    exact_solution = corpus.solution(k, 'exhaustive_v3')
+    greedy_solution = corpus.solution(k, 'greedy')
+    if exact_solution is None or greedy_solution is None:
         continue
-    if 'p25' in file:
-        row = 0
-    elif 'p50' in file:
-        row = 1
-    elif 'p75' in file:
-        row = 2
-    with open(f'./results/greedy/{file}', 'rb') as f:
-        _ = pickle.load(f)
-        _ = pickle.load(f)
-        chromatic_number = pickle.load(f)
-    
-    greedy_results[row][n_nodes-2] = chromatic_number
+    n_nodes, p = corpus.params(k)
+    row = EDGE_PERCENTAGES.index(p)
+
+    exact_results[row][n_nodes-2] = exact_solution[0]
+    greedy_results[row][n_nodes-2] = greedy_solution[0]
     
 
 wrong = greedy_results-exact_results
@@ -1,16 +1,26 @@
 """Tests an exhaustive search algorithm for finding the chromatic number
 of the previously generated graphs.
-Creates a pickle file containing the adjacency list, the coordinates of the nodes,
-the chromatic number and an optimal colouring solution for each graph. 
+Stores the chromatic number and an optimal colouring solution for each
+graph in the graph corpus file.
 Also saves the empirical complexity data from running the algorithm for all
 the graphs in a pickle file."""
 
+from concurrent.futures import as_completed, ProcessPoolExecutor
+from functools import partial
 from itertools import product
 from math import inf as inf
-import os
+import multiprocessing
 import pickle
 import time
 
+import numpy as np
+
+from bitset_graph import BitsetGraph
+from graph_corpus import GraphCorpus, save_solutions
+from greedy_heuristic import chromatic_number_greedy, greedy_clique
+from instrumentation import bind_counters, count_operations, instrumented
+from result_cache import ResultCache
+
 ########## EXHAUSTIVE SEARCH ALGORITHMS #############
 
 def generate_all_configs(n_nodes, n_colours=None):
@@ -27,46 +37,49 @@ def generate_all_configs(n_nodes, n_colours=None):
     return colour_combinations
 
 
-def valid_config(adj_list, colour_config):
+@instrumented('n_comparisons')
+def valid_config(adj_list, colour_config, *, counters=None):
     """Returns True if the graph is properly coloured (no two adjacent 
     vertices have the same colour). Returns False otherwise."""
-    global n_comparisons
 
     for node in adj_list:
         for neighbour in adj_list[node]:
-            n_comparisons += 1
+            counters.n_comparisons += 1
             if colour_config[node] == colour_config[neighbour]:
                 return False 
     return True
 
 
-def chromatic_number_exhaustive_v1(adj_list):
+@instrumented('n_configurations', 'n_comparisons')
+def chromatic_number_exhaustive_v1(adj_list, valid_func=valid_config, *,
+                                   counters=None):
     """Returns the chromatic number of a given undirected graph
     represented by its adjacency list and one possible colour combination
     to obtain it."""
     # Iterates through ALL (n^n) possibilities of colouring n nodes with
     # n colours and finds the one using less colours.
 
-    global n_configurations
-    global n_comparisons
-
     n_nodes = len(adj_list)
     colour_combinations = generate_all_configs(n_nodes)
     chromatic_number = inf  # current best chromatic number
     best_colours = None     # current best colour configuration
+    valid_func = bind_counters(valid_func, counters=counters)
 
-    for colour_config in colour_combinations:
-        n_configurations += 1
-        if valid_config(adj_list, colour_config):
-            n_comparisons += 1
-            if (cur_c_number:=len(set(colour_config))) < chromatic_number:
-                chromatic_number = cur_c_number
-                best_colours = list(colour_config)
+    with counters.phase('search'):
+        for colour_config in colour_combinations:
+            counters.n_configurations += 1
+            if valid_func(adj_list, colour_config):
+                counters.n_comparisons += 1
+                if (cur_c_number:=len(set(colour_config))) < chromatic_number:
+                    chromatic_number = cur_c_number
+                    best_colours = list(colour_config)
     
     return chromatic_number, best_colours
 
 
-def chromatic_number_exhaustive_v2(adj_list):
+@instrumented('n_configurations', 'n_comparisons')
+def chromatic_number_exhaustive_v2(adj_list, valid_func=valid_config, *,
+                                   counters=None):
     """Returns the chromatic number of a given undirected graph
     represented by its adjacency list and one possible colour combination
     to obtain it."""
@@ -74,30 +87,33 @@ def chromatic_number_exhaustive_v2(adj_list):
     # possibilities of colouring n nodes with n colours 
     # and finds the one using less colours.
 
-    global n_configurations
-    global n_comparisons
-
     n_nodes = len(adj_list)
     max_configs = n_nodes ** (n_nodes - 1)  # last configuration to be checked
     colour_combinations = generate_all_configs(n_nodes)
     chromatic_number = inf  # current best chromatic number
     best_colours = None     # current best colour configuration
+    n_checked = 0
+    valid_func = bind_counters(valid_func, counters=counters)
 
-    for colour_config in colour_combinations:
-        # == because n_configurations starts at 0
-        if n_configurations == max_configs:
-            break
-        n_configurations += 1
-        if valid_config(adj_list, colour_config):
-            n_comparisons += 1
-            if (cur_number:=len(set(colour_config))) < chromatic_number:
-                chromatic_number = cur_number
-                best_colours = list(colour_config)
+    with counters.phase('search'):
+        for colour_config in colour_combinations:
+            # == because n_checked starts at 0
+            if n_checked == max_configs:
+                break
+            n_checked += 1
+            counters.n_configurations += 1
+            if valid_func(adj_list, colour_config):
+                counters.n_comparisons += 1
+                if (cur_number:=len(set(colour_config))) < chromatic_number:
+                    chromatic_number = cur_number
+                    best_colours = list(colour_config)
     
     return chromatic_number, best_colours
 
 
-def chromatic_number_exhaustive_v3(adj_list):
+@instrumented('n_configurations', 'n_comparisons')
+def chromatic_number_exhaustive_v3(adj_list, valid_func=valid_config, *,
+                                   counters=None):
     """Returns the chromatic number of a given undirected graph
     represented by its adjacency list and one possible colour combination
     to obtain it."""
@@ -106,93 +122,751 @@ def chromatic_number_exhaustive_v3(adj_list):
     # using n_colours colours. 
     # Stops if a valid solution is found and adds one colour otherwise.
 
-    global n_configurations
-
     n_nodes = len(adj_list)
     max_configs = 0  # last configuration to be checked
+    n_checked = 0
+    valid_func = bind_counters(valid_func, counters=counters)
+
+    with counters.phase('search'):
+        for n_colours in range(2, n_nodes + 1):    
+            max_configs += n_colours ** (n_nodes - 1)
+            colour_combinations = generate_all_configs(n_nodes, n_colours)
+            
+            for colour_config in colour_combinations:
+                if n_checked == max_configs:
+                    # == because n_checked starts at 0
+                    break
+
+                n_checked += 1
+                counters.n_configurations += 1
+                if valid_func(adj_list, colour_config):
+                    # If we find a valid configuration for the current
+                    # n_colours, it must be an optimal solution.
+                    chromatic_number = len(set(colour_config))
+                    best_colours = list(colour_config)
+                    return chromatic_number, best_colours      
+
+
+@instrumented('n_configurations', 'n_comparisons')
+def chromatic_number_exhaustive_v4(adj_list, *, counters=None):
+    """Returns the chromatic number of a given undirected graph
+    represented by its adjacency list and one possible colour combination
+    to obtain it."""
+    # Like v3, starts with n_colours=1 and adds one colour while no valid
+    # configuration exists, but builds the configurations node by node
+    # (backtracking) instead of enumerating them all with product().
+    # A partial configuration is abandoned as soon as a node gets the same
+    # colour as an already coloured neighbour, and node i can only use the
+    # colours 0..max_used+1, where max_used is the highest colour given to
+    # nodes 0..i-1 (all other choices are just renamings of the colours).
 
-    for n_colours in range(2, n_nodes + 1):    
-        max_configs += n_colours ** (n_nodes - 1)
-        colour_combinations = generate_all_configs(n_nodes, n_colours)
-        
-        for colour_config in colour_combinations:
-            if n_configurations == max_configs:
-                # == because n_configurations starts at 0
-                break
+    n_nodes = len(adj_list)
+    # Only the neighbours coloured before each node need to be compared:
+    prev_neighbours = [[neighbour for neighbour in adj_list[node]
+                        if neighbour < node] for node in range(n_nodes)]
+    colour_config = [None] * n_nodes
+
+    def colour_from(node, max_used, n_colours):
+        """Tries to colour nodes node..n_nodes-1 with n_colours colours,
+        given that nodes 0..node-1 are already coloured using the colours
+        0..max_used. Returns True if a valid configuration is found."""
+
+        if node == n_nodes:
+            return True
+
+        for colour in range(min(max_used + 2, n_colours)):
+            counters.n_configurations += 1
+            for neighbour in prev_neighbours[node]:
+                counters.n_comparisons += 1
+                if colour_config[neighbour] == colour:
+                    break
+            else:
+                colour_config[node] = colour
+                if colour_from(node + 1, max(max_used, colour), n_colours):
+                    return True
+        return False
+
+    for n_colours in range(1, n_nodes + 1):
+        with counters.phase('search'):
+            found = colour_from(0, -1, n_colours)
+        if found:
+            # If we find a valid configuration for the current
+            # n_colours, it must be an optimal solution.
+            chromatic_number = len(set(colour_config))
+            best_colours = list(colour_config)
+            return chromatic_number, best_colours
+
+
+@instrumented('n_configurations', 'n_comparisons')
+def chromatic_number_exhaustive_v5(adj_list, lower_bound=0, upper_colours=None,
+                                   *, counters=None):
+    """Returns the chromatic number of a given undirected graph
+    represented by its adjacency list and one possible colour combination
+    to obtain it. A known lower bound for the chromatic number and a known
+    valid colour configuration can be given to start from better bounds.
+    lower_bound may also be a number of colours the caller needs anyway
+    (like the chromatic number of a larger graph containing this one): the
+    search then stops at the first colouring using at most that many
+    colours, which is returned instead of an optimal one."""
+    # Branch and bound with DSATUR ordering. The greedy heuristic gives
+    # the initial solution (upper bound) and a greedily found clique gives a
+    # lower bound, since all its nodes need different colours.
+    # At each step, colours the uncoloured node whose neighbours already use
+    # the largest number of different colours (saturation degree), trying
+    # every colour that keeps the partial solution valid and uses less
+    # colours than the best solution so far.
+    # Stops as soon as a solution uses no more colours than the lower bound.
 
-            n_configurations += 1
-            if valid_config(adj_list, colour_config):
-                # If we find a valid configuration for the current
-                # n_colours, it must be an optimal solution.
-                chromatic_number = len(set(colour_config))
-                best_colours = list(colour_config)
-                return chromatic_number, best_colours      
+    n_nodes = len(adj_list)
+    with counters.phase('bounds'):
+        upper_bound, greedy_colours = chromatic_number_greedy(adj_list)
+        best_colours = [greedy_colours[node] for node in range(n_nodes)]
+        if upper_colours and len(set(upper_colours)) < upper_bound:
+            upper_bound = len(set(upper_colours))
+            best_colours = list(upper_colours)
+        clique = greedy_clique(adj_list)
+    lower_bound = max(lower_bound, len(clique))
+    if upper_bound <= lower_bound:
+        return upper_bound, best_colours
+
+    colour_config = [None] * n_nodes
+    # neighbour_colours[node][colour] is the number of neighbours of node
+    # with that colour, saturation[node] the number of different colours and
+    # degree[node] the number of uncoloured neighbours.
+    neighbour_colours = [[0] * upper_bound for _ in range(n_nodes)]
+    saturation = [0] * n_nodes
+    degree = [len(adj_list[node]) for node in range(n_nodes)]
+
+    def assign(node, colour):
+        colour_config[node] = colour
+        for neighbour in adj_list[node]:
+            if neighbour_colours[neighbour][colour] == 0:
+                saturation[neighbour] += 1
+            neighbour_colours[neighbour][colour] += 1
+            degree[neighbour] -= 1
 
+    def unassign(node, colour):
+        colour_config[node] = None
+        for neighbour in adj_list[node]:
+            neighbour_colours[neighbour][colour] -= 1
+            if neighbour_colours[neighbour][colour] == 0:
+                saturation[neighbour] -= 1
+            degree[neighbour] += 1
+
+    def colour_from(n_coloured, n_used):
+        """Colours the remaining nodes given that n_coloured nodes are
+        already coloured using n_used colours. Returns True if the
+        lower bound was reached (the search can stop)."""
+        nonlocal upper_bound
+        nonlocal best_colours
+
+        if n_coloured == n_nodes:
+            upper_bound = n_used
+            best_colours = list(colour_config)
+            return upper_bound <= lower_bound
+
+        # Choose the uncoloured node with maximum saturation degree,
+        # breaking ties by maximum number of uncoloured neighbours.
+        node = max((n for n in range(n_nodes) if colour_config[n] is None),
+                   key=lambda n: (saturation[n], degree[n]))
+
+        # Only colours that keep the solution better than the best one
+        # (the upper bound may decrease while trying the colours).
+        colour = 0
+        while colour < min(n_used + 1, upper_bound - 1):
+            counters.n_comparisons += 1
+            if not neighbour_colours[node][colour]:
+                counters.n_configurations += 1
+                assign(node, colour)
+                done = colour_from(n_coloured + 1, max(n_used, colour + 1))
+                unassign(node, colour)
+                if done:
+                    return True
+            colour += 1
+        return False
+
+    # The nodes of the clique must all have different colours.
+    for colour, node in enumerate(clique):
+        assign(node, colour)
+    with counters.phase('search'):
+        colour_from(len(clique), len(clique))
+
+    return upper_bound, best_colours
+
+
+########## BITSET EXHAUSTIVE SEARCH ALGORITHMS #############
+
+@instrumented('n_comparisons')
+def valid_config_bitset(graph, colour_config, *, counters=None):
+    """Returns True if the BitsetGraph is properly coloured (no two adjacent 
+    vertices have the same colour). Returns False otherwise."""
+    # Each node is compared at once with all the previous nodes with the
+    # same colour, by keeping the bitmask of each colour class.
+
+    neighbours = graph.neighbours
+    colour_classes = [0] * graph.n_nodes
+    for node, colour in enumerate(colour_config):
+        counters.n_comparisons += 1
+        if neighbours[node] & colour_classes[colour]:
+            return False
+        colour_classes[colour] |= 1 << node
+    return True
 
-########## EXHAUSTIVE SEARCH TESTING #############
 
-def save_complexity_data():
-    with open(f'./results/exhaustive_analysis_{func_name[-2:]}.pkl', 'wb') as f:
-        pickle.dump(empirical_analysis, f)
-    print('\nUploaded complexity results to file.')
+@instrumented('n_configurations', 'n_comparisons')
+def chromatic_number_exhaustive_v1_bitset(graph, *, counters=None):
+    """Same as chromatic_number_exhaustive_v1, for a BitsetGraph."""
+    return chromatic_number_exhaustive_v1(graph, valid_config_bitset,
+                                           counters=counters)
+
+
+@instrumented('n_configurations', 'n_comparisons')
+def chromatic_number_exhaustive_v2_bitset(graph, *, counters=None):
+    """Same as chromatic_number_exhaustive_v2, for a BitsetGraph."""
+    return chromatic_number_exhaustive_v2(graph, valid_config_bitset,
+                                           counters=counters)
+
+
+@instrumented('n_configurations', 'n_comparisons')
+def chromatic_number_exhaustive_v3_bitset(graph, *, counters=None):
+    """Same as chromatic_number_exhaustive_v3, for a BitsetGraph."""
+    return chromatic_number_exhaustive_v3(graph, valid_config_bitset,
+                                           counters=counters)
+
+
+@instrumented('n_configurations', 'n_comparisons')
+def chromatic_number_exhaustive_v4_bitset(graph, *, counters=None):
+    """Same as chromatic_number_exhaustive_v4, for a BitsetGraph."""
+    # Keeps the bitmask of the nodes coloured with each colour, so checking
+    # a colour for a node against all its coloured neighbours is one AND.
+
+    n_nodes = graph.n_nodes
+    neighbours = graph.neighbours
+    colour_config = [None] * n_nodes
+    colour_classes = [0] * n_nodes
+
+    def colour_from(node, max_used, n_colours):
+        """Tries to colour nodes node..n_nodes-1 with n_colours colours,
+        given that nodes 0..node-1 are already coloured using the colours
+        0..max_used. Returns True if a valid configuration is found."""
+
+        if node == n_nodes:
+            return True
+
+        for colour in range(min(max_used + 2, n_colours)):
+            counters.n_configurations += 1
+            counters.n_comparisons += 1
+            if neighbours[node] & colour_classes[colour]:
+                continue
+            colour_config[node] = colour
+            colour_classes[colour] |= 1 << node
+            if colour_from(node + 1, max(max_used, colour), n_colours):
+                return True
+            colour_classes[colour] ^= 1 << node
+        return False
+
+    for n_colours in range(1, n_nodes + 1):
+        with counters.phase('search'):
+            found = colour_from(0, -1, n_colours)
+        if found:
+            chromatic_number = len(set(colour_config))
+            best_colours = list(colour_config)
+            return chromatic_number, best_colours
+
+
+########## VECTORISED EXHAUSTIVE SEARCH ALGORITHMS #############
+
+def edge_array(adj_list):
+    """Returns an (n_edges, 2) array with the two nodes of each edge
+    of the graph, each edge appearing once."""
+
+    edges = [(node, neighbour) for node in adj_list 
+             for neighbour in adj_list[node] if node < neighbour]
+    return np.array(edges, dtype=np.intp).reshape(-1, 2)
+
+
+def generate_configs_block(start, n_configs, n_nodes, n_colours):
+    """Generate the block of colour configurations number start to
+    start+n_configs-1, in the same order as generate_all_configs, as a 
+    (n_configs, n_nodes) array. Each configuration is the number written
+    in base n_colours, with node 0 as the most significant digit."""
+    # The array is stored column by column, since the configurations are
+    # compared one node (column) at a time. Each column repeats the pattern
+    # 0,..,0,1,..,1,..., with each colour repeated n_colours^(n_nodes-1-node)
+    # times, so it can be copied from that pattern instead of computed.
+
+    configs = np.empty((n_configs, n_nodes), dtype=np.int8, order='F')
+    for node in range(n_nodes):
+        n_repeats = n_colours ** (n_nodes - 1 - node)
+        if n_repeats >= n_configs:
+            # The colour changes at most once inside the block.
+            colour = start // n_repeats % n_colours
+            change = n_repeats - start % n_repeats
+            configs[:change, node] = colour
+            configs[change:, node] = (colour + 1) % n_colours
+        else:
+            pattern = np.repeat(np.arange(n_colours, dtype=np.int8), n_repeats)
+            pattern = np.roll(pattern, -(start % len(pattern)))
+            configs[:, node] = np.resize(pattern, n_configs)
+    return configs
 
-MAX_NODES = 13
 
-try:
-    empirical_analysis = {}
-    chromatic_number_func = chromatic_number_exhaustive_v3
-    func_name = chromatic_number_func.__name__
-    results_path = f'./results/exhaustive_{func_name[-2:]}'
+@instrumented('n_comparisons')
+def valid_configs_batch(edges, configs, *, counters=None):
+    """Returns a boolean array telling which rows of configs (one colour
+    configuration per row) are properly coloured graphs, given the array
+    of edges of the graph."""
 
-    print('Performing exhaustive search for all graphs' + 
-          f', using {func_name}.\n')
+    valid = np.ones(len(configs), dtype=bool)
+    for node, neighbour in edges:
+        counters.n_comparisons += len(configs)
+        valid &= configs[:, node] != configs[:, neighbour]
+    return valid
 
-    if not os.path.exists(results_path):
-        os.makedirs(results_path)
 
-    for file in os.listdir('./graphs/'):
-        if int(file[:2]) > MAX_NODES:
+@instrumented('n_configurations', 'n_comparisons')
+def chromatic_number_exhaustive_vec(adj_list, block_size=100_000, *, 
+                                    counters=None):
+    """Returns the chromatic number of a given undirected graph
+    represented by its adjacency list and one possible colour combination
+    to obtain it."""
+    # Same search as v3, but instead of testing the configurations one by
+    # one, generates blocks of block_size configurations as a numpy array 
+    # and tests all of them at once, one edge at a time.
+    # Stops at the first valid configuration found.
+
+    n_nodes = len(adj_list)
+    edges = edge_array(adj_list)
+
+    for n_colours in range(2, n_nodes + 1):
+        # First n_colours^(n_nodes-1) configurations (node 0 has colour 0).
+        max_configs = n_colours ** (n_nodes - 1)
+        for start in range(0, max_configs, block_size):
+            n_configs = min(block_size, max_configs - start)
+            with counters.phase('generation'):
+                configs = generate_configs_block(start, n_configs, 
+                                                 n_nodes, n_colours)
+            with counters.phase('validation'):
+                valid = valid_configs_batch(edges, configs, counters=counters)
+            if valid.any():
+                first_valid = int(np.argmax(valid))
+                counters.n_configurations += first_valid + 1
+                best_colours = configs[first_valid].tolist()
+                chromatic_number = len(set(best_colours))
+                return chromatic_number, best_colours
+            counters.n_configurations += n_configs
+
+
+########## PARALLEL EXHAUSTIVE SEARCH ALGORITHMS #############
+
+# Set in each worker process, to tell it that another worker already
+# found a valid configuration.
+_stop_search = None
+
+
+def _init_worker(stop_search):
+    global _stop_search
+    _stop_search = stop_search
+
+
+def _search_configs_range(edges, n_nodes, n_colours, start, stop, 
+                          block_size=100_000):
+    """Tests the colour configurations number start to stop-1 in blocks,
+    as chromatic_number_exhaustive_vec does, in a worker process. 
+    Returns the first valid configuration found (or None) and the number
+    of configurations tested and comparisons performed."""
+
+    n_comparisons = 0
+    n_tested = 0
+    for block_start in range(start, stop, block_size):
+        if _stop_search.is_set():
             break
-        if file.endswith('.png'):
-            continue
-
-        print(f'Searching graph {file[:-3]}...', end='', flush=True)
-        with open(f'./graphs/{file}', 'rb') as f:
-            adj_list = pickle.load(f)
-            coords = pickle.load(f)
-
-        n_configurations = 0
-        n_comparisons = 0
-
-        t_start = time.time()
-        chromatic_number, best_colours = chromatic_number_func(adj_list)
-        t_end = time.time()
-        elapsed_time = t_end - t_start
-
-        if elapsed_time < 1e-3:
-            n_runs = 1000
-            t_start = time.time()
-            for _ in range(n_runs):
-                n_configurations = 0
-                n_comparisons = 0
-                chromatic_number, best_colours = chromatic_number_func(adj_list)
-            t_end = time.time()
-            elapsed_time = (t_end - t_start) / n_runs
-            print(f' DONE in {1000*elapsed_time:.3f} ms')
-        else:
-            print(f' DONE in {elapsed_time:.3f} s')
-
-        empirical_analysis[file] = {'n_configurations': n_configurations,
-                                    'n_comparisons': n_comparisons,
-                                    'e_time': elapsed_time}
-
-        with open(f'{results_path}/{file}', 'wb') as f:
-            pickle.dump(adj_list, f)
-            pickle.dump(coords, f)
-            pickle.dump(chromatic_number, f)
-            pickle.dump(best_colours, f)
-
-    save_complexity_data()    
-except KeyboardInterrupt:
-    print(' CANCELLED')
-    save_complexity_data()
+        n_configs = min(block_size, stop - block_start)
+        configs = generate_configs_block(block_start, n_configs, 
+                                         n_nodes, n_colours)
+        valid = valid_configs_batch(edges, configs)
+        # Same count as valid_configs_batch.
+        n_comparisons += n_configs * len(edges)
+        if valid.any():
+            first_valid = int(np.argmax(valid))
+            n_tested += first_valid + 1
+            return configs[first_valid].tolist(), n_tested, n_comparisons
+        n_tested += n_configs
+    return None, n_tested, n_comparisons
+
+
+@instrumented('n_configurations', 'n_comparisons')
+def chromatic_number_exhaustive_par(adj_list, workers=None, 
+                                    chunk_size=1_000_000, *, counters=None):
+    """Returns the chromatic number of a given undirected graph
+    represented by its adjacency list and one possible colour combination
+    to obtain it."""
+    # Same search as vec, but the configurations for each n_colours are
+    # split into ranges of chunk_size configurations (all the configurations
+    # with the same first colours), which are tested by a pool of workers 
+    # processes (os.cpu_count() if workers is not given).
+    # When a worker finds a valid configuration, the ranges not yet started
+    # are cancelled and the running ones stop at their next block.
+
+    n_nodes = len(adj_list)
+    edges = edge_array(adj_list)
+    stop_search = multiprocessing.Event()
+
+    with ProcessPoolExecutor(workers, initializer=_init_worker, 
+                             initargs=(stop_search, )) as executor:
+        for n_colours in range(2, n_nodes + 1):
+            # First n_colours^(n_nodes-1) configurations (node 0 has colour 0).
+            max_configs = n_colours ** (n_nodes - 1)
+            futures = [executor.submit(_search_configs_range, edges, n_nodes, 
+                                       n_colours, start, 
+                                       min(start + chunk_size, max_configs))
+                       for start in range(0, max_configs, chunk_size)]
+
+            best_colours = None
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                colour_config, n_tested, n_compars = future.result()
+                counters.n_configurations += n_tested
+                counters.n_comparisons += n_compars
+                if colour_config and not best_colours:
+                    best_colours = colour_config
+                    stop_search.set()
+                    for other_future in futures:
+                        other_future.cancel()
+            stop_search.clear()
+
+            if best_colours:
+                chromatic_number = len(set(best_colours))
+                return chromatic_number, best_colours
+
+
+########## INCLUSION-EXCLUSION EXHAUSTIVE SEARCH ALGORITHM #############
+
+# Prime modulo which the numbers of colourings are computed, since they are
+# too large for int64. It is 2^31 - 1, so residues are reduced with shifts
+# instead of divisions, and the product of two residues fits in int64.
+IE_PRIME = 2_147_483_647
+# Number of subsets whose powers are computed together, small enough for
+# the arrays to stay in the CPU cache.
+IE_CHUNK = 1 << 16
+
+
+def neighbour_masks(adj_list, nodes):
+    """Returns the bitmask of the neighbours of each of the nodes in the
+    subgraph induced by nodes, where nodes[i] is bit i."""
+    bits = {node: 1 << i for i, node in enumerate(nodes)}
+    return [sum(bits[neighbour] for neighbour in adj_list[node] 
+                if neighbour in bits)
+            for node in nodes]
+
+
+def independent_set_counts(neighbours):
+    """Returns an array with the number of independent sets (the empty one
+    included) of the subgraph induced by every subset S of the nodes, at
+    position S, given the bitmasks of the neighbours of the nodes."""
+    # The independent sets of S are the ones without its largest node v and
+    # the ones with v and none of its neighbours, so
+    #     i(S) = i(S - {v}) + i(S - N[v])
+    # and the table for the subsets of the nodes 0..v is filled from the 
+    # table for the subsets of 0..v-1.
+
+    counts = np.ones(1 << len(neighbours), dtype=np.int64)
+    for node, mask in enumerate(neighbours):
+        lower = np.arange(1 << node, dtype=np.int64)
+        counts[1 << node:2 << node] = counts[:1 << node] + counts[lower & ~mask]
+    return counts
+
+
+def subset_signs(n_nodes):
+    """Returns an array with (-1)^|S| for every subset S of n_nodes nodes,
+    at position S."""
+    signs = np.ones(1 << n_nodes, dtype=np.int64)
+    for node in range(n_nodes):
+        signs[1 << node:2 << node] = -signs[:1 << node]
+    return signs
+
+
+def reduce_mersenne(values, carry):
+    """Reduces values (at most 2^62) modulo IE_PRIME in place, leaving them 
+    at most 2^31. carry is an array of the same size for the intermediate
+    results."""
+    # 2^31 = 1 modulo IE_PRIME, so the bits above the 31st are added to the
+    # lower ones.
+    for _ in range(2):
+        np.right_shift(values, 31, out=carry)
+        np.bitwise_and(values, IE_PRIME, out=values)
+        values += carry
+
+
+@instrumented('n_subsets')
+def colourable(neighbours, k_values, max_table_bits=22, *, counters=None):
+    """Returns the numbers of colours k in k_values (in increasing order) 
+    with which the graph given by the bitmasks of the neighbours of its 
+    nodes can be coloured."""
+    # Björklund-Husfeldt-Koivisto inclusion-exclusion: the number of ways
+    # of covering the nodes V with k (ordered) independent sets is
+    #     c_k = sum over all S ⊆ V of (-1)^(|V|-|S|) i(S)^k
+    # where i(S) is the number of independent sets of S, and the graph is 
+    # k-colourable if and only if c_k > 0. c_k is computed modulo IE_PRIME,
+    # so a k-colouring could only be missed if c_k was a multiple of it.
+    # Only the table of i for the subsets B of the first max_table_bits
+    # nodes is kept. The subsets A of the other nodes are gone through one
+    # at a time, with the table of i(A ∪ B) for all B given by
+    #     i(A ∪ B) = sum over the independent X ⊆ A of i(B - N(X))
+    # which has few terms for dense graphs, and fewer when the nodes of A
+    # are the ones with most neighbours.
+    # The memory used is six int64 arrays of 2^max_table_bits entries: the
+    # table, the subsets B, their signs, the counts for the current A and
+    # two buffers for the terms, so 48 * 2^max_table_bits bytes (192 MiB
+    # for the default 22), besides the arrays of IE_CHUNK entries.
+
+    order = sorted(range(len(neighbours)), 
+                   key=lambda node: neighbours[node].bit_count())
+    position = {node: i for i, node in enumerate(order)}
+    neighbours = [sum(1 << position[neighbour] 
+                      for neighbour in range(len(order)) 
+                      if neighbours[node] >> neighbour & 1)
+                  for node in order]
+
+    n_nodes = len(neighbours)
+    n_low = min(n_nodes, max_table_bits)
+    low_nodes = (1 << n_low) - 1
+    k_values = sorted(k_values)
+
+    base = independent_set_counts(neighbours[:n_low])
+    subsets = np.arange(1 << n_low, dtype=np.int64)
+    signs = subset_signs(n_low)
+
+    # Independent sets X of the other nodes, as (X, low neighbours of X).
+    independent = [(0, 0)]
+    for i, mask in enumerate(neighbours[n_low:]):
+        independent += [(x | 1 << i, low | mask & low_nodes)
+                        for x, low in independent if not x & mask >> n_low]
+
+    counts = np.empty_like(base)
+    term_subsets = np.empty_like(base)
+    term_counts = np.empty_like(base)
+
+    totals = dict.fromkeys(k_values, 0)
+    for high in range(1 << (n_nodes - n_low)):
+        terms = [low for x, low in independent if not x & ~high]
+        counters.n_subsets += len(terms) << n_low
+        # The first term is X = {}.
+        np.copyto(counts, base)
+        for low in terms[1:]:
+            np.bitwise_and(subsets, ~low, out=term_subsets)
+            # Without clipping (the indices are valid anyway) take copies
+            # the result to a new array.
+            np.take(base, term_subsets, out=term_counts, mode='clip')
+            counts += term_counts
+
+        counts %= IE_PRIME
+        # (-1)^(|V|-|S|) for S = A ∪ B is sign * signs[B].
+        sign = -1 if (n_nodes - high.bit_count()) % 2 else 1
+        for start in range(0, len(counts), IE_CHUNK):
+            residues = counts[start:start + IE_CHUNK]
+            chunk_signs = signs[start:start + IE_CHUNK]
+            powers = np.ones_like(residues)
+            carry = np.empty_like(residues)
+            k = 0
+            for k_value in k_values:
+                while k < k_value:
+                    powers *= residues
+                    reduce_mersenne(powers, carry)
+                    k += 1
+                totals[k] += sign * int(np.dot(powers, chunk_signs))
+
+    return [k for k in k_values if totals[k] % IE_PRIME]
+
+
+def maximal_independent_sets(neighbours, nodes, node):
+    """Yields the maximal independent sets containing node of the subgraph
+    induced by the nodes in the bitmask nodes, as bitmasks, given the 
+    bitmasks of the neighbours of all the nodes."""
+    # Bron-Kerbosch algorithm with pivoting, on the complement graph: every
+    # maximal set extending chosen contains the pivot or a neighbour of it.
+
+    def extend(chosen, candidates, excluded):
+        if not candidates:
+            if not excluded:
+                yield chosen
+            return
+        pivot = min((bit.bit_length() - 1 for bit in _bits(candidates | excluded)),
+                    key=lambda u: (candidates & neighbours[u]).bit_count())
+        branch = candidates & (neighbours[pivot] | 1 << pivot)
+        for bit in _bits(branch):
+            v = bit.bit_length() - 1
+            yield from extend(chosen | bit, candidates & ~neighbours[v] & ~bit,
+                              excluded & ~neighbours[v])
+            candidates &= ~bit
+            excluded |= bit
+
+    yield from extend(1 << node, nodes & ~neighbours[node] & ~(1 << node), 0)
+
+
+def _bits(mask):
+    """Yields the bits set in mask, from the lowest."""
+    while mask:
+        bit = mask & -mask
+        yield bit
+        mask ^= bit
+
+
+@instrumented('n_subsets', 'n_colourability_tests')
+def chromatic_number_exhaustive_ie(adj_list, max_table_bits=22, *, 
+                                   counters=None):
+    """Returns the chromatic number of a given undirected graph
+    represented by its adjacency list and one possible colour combination
+    to obtain it. The tables used have at most 2^max_table_bits entries, so
+    larger graphs take longer, but not more memory: at most about
+    48 * 2^max_table_bits bytes (192 MiB for the default 22)."""
+    # Counts the coverings by independent sets (see colourable) for all the
+    # numbers of colours between the size of a clique and the colours of
+    # the greedy heuristic at once, in O*(2^n) time whatever the density.
+    # Then builds a colouring one colour class at a time: the class of the
+    # first node left is a maximal independent set of the nodes left 
+    # containing it such that the rest can be coloured with one colour
+    # less, which is first tried with the greedy heuristic.
+
+    n_nodes = len(adj_list)
+    with counters.phase('bounds'):
+        upper_bound, greedy_colours = chromatic_number_greedy(adj_list)
+        best_colours = [greedy_colours[node] for node in range(n_nodes)]
+        lower_bound = len(greedy_clique(adj_list))
+    if lower_bound == upper_bound:
+        return upper_bound, best_colours
+
+    nodes = list(range(n_nodes))
+    neighbours = neighbour_masks(adj_list, nodes)
+    with counters.phase('counting'):
+        counters.n_colourability_tests += 1
+        k_values = colourable(neighbours, range(lower_bound, upper_bound), 
+                              max_table_bits, counters=counters)
+    if not k_values:
+        return upper_bound, best_colours
+    chromatic_number = k_values[0]
+
+    with counters.phase('extraction'):
+        colours = [None] * n_nodes
+        left = (1 << n_nodes) - 1
+        for colour in range(chromatic_number):
+            first = (left & -left).bit_length() - 1
+            for colour_class in maximal_independent_sets(neighbours, left, 
+                                                         first):
+                rest = [node for node in nodes 
+                        if left >> node & 1 and not colour_class >> node & 1]
+                rest_adj_list = {i: [rest.index(neighbour) 
+                                     for neighbour in adj_list[node]
+                                     if neighbour in rest]
+                                 for i, node in enumerate(rest)}
+                n_colours, rest_colours = chromatic_number_greedy(rest_adj_list)
+                if n_colours < chromatic_number - colour:
+                    break
+                counters.n_colourability_tests += 1
+                if colourable(neighbour_masks(adj_list, rest), 
+                              [chromatic_number - colour - 1], 
+                              max_table_bits, counters=counters):
+                    rest_colours = None
+                    break
+            else:
+                # Only if the count of the colourings was wrongly nonzero.
+                raise RuntimeError('no colouring found with '
+                                   f'{chromatic_number} colours')
+
+            for node in nodes:
+                if colour_class >> node & 1:
+                    colours[node] = colour
+            left &= ~colour_class
+            if rest_colours is not None:
+                # The greedy heuristic coloured the rest.
+                for i, node in enumerate(rest):
+                    colours[node] = colour + 1 + rest_colours[i]
+                break
+
+    return chromatic_number, colours
+
+
+########## EXHAUSTIVE SEARCH TESTING #############
+
+def save_complexity_data():
+    with open(f'./results/exhaustive_analysis_{version}.pkl', 'wb') as f:
+        pickle.dump(empirical_analysis, f)
+    print('\nUploaded complexity results to file.')
+
+MAX_NODES = 20
+
+if __name__ == '__main__':
+    try:
+        empirical_analysis = {}
+        cache = ResultCache()
+        chromatic_number_func = chromatic_number_exhaustive_v5
+        func_name = chromatic_number_func.__name__
+        version = func_name.removeprefix('chromatic_number_exhaustive_')
+        corpus = GraphCorpus()
+        solutions = {}
+
+        print('Performing exhaustive search for all graphs' + 
+              f', using {func_name}.\n')
+
+        for k in corpus.instances(MAX_NODES):
+            file = f'{corpus.name(k)}.pkl'
+            print(f'Searching graph {file[:-3]}...', end='', flush=True)
+            adj_list = corpus.adj_list(k)
+            if func_name.endswith('_bitset'):
+                graph = BitsetGraph.from_adj_list(adj_list)
+            else:
+                graph = adj_list
+
+            cached = cache.get(adj_list, func_name)
+            if cached:
+                chromatic_number = cached['chromatic_number']
+                best_colours = cached['colours']
+                empirical_analysis[file] = cached['analysis']
+                print(' CACHED')
+            else:
+                options = {}
+                if func_name.endswith('_v5'):
+                    # Start from the bounds given by the already solved
+                    # graphs with one node less, if any (none for the
+                    # independent random graphs of the corpus).
+                    lower_bound, upper_colours = cache.bounds(adj_list)
+                    options = {'lower_bound': lower_bound,
+                               'upper_colours': upper_colours}
+                solve = partial(chromatic_number_func, **options)
+
+                # Timed runs without counters, and a separate run to count
+                # the operations.
+                t_start = time.time()
+                chromatic_number, best_colours = solve(graph)
+                t_end = time.time()
+                elapsed_time = t_end - t_start
+
+                if elapsed_time < 1e-3:
+                    n_runs = 1000
+                    t_start = time.time()
+                    for _ in range(n_runs):
+                        chromatic_number, best_colours = solve(graph)
+                    t_end = time.time()
+                    elapsed_time = (t_end - t_start) / n_runs
+                    print(f' DONE in {1000*elapsed_time:.3f} ms')
+                else:
+                    print(f' DONE in {elapsed_time:.3f} s')
+
+                _, counters = count_operations(chromatic_number_func, graph,
+                                               **options)
+                empirical_analysis[file] = {**counters.as_dict(),
+                                            'e_time': elapsed_time}
+                cache.put(adj_list, func_name, chromatic_number, best_colours,
+                          empirical_analysis[file])
+
+            solutions[k] = (chromatic_number, best_colours)
+
+        save_complexity_data()    
+        save_solutions(f'exhaustive_{version}', solutions)
+        cache.save()
+    except KeyboardInterrupt:
+        print(' CANCELLED')
+        save_complexity_data()
+        save_solutions(f'exhaustive_{version}', solutions)
+        cache.save()
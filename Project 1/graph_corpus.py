@@ -0,0 +1,256 @@
+"""Single packed file holding all the graph instances (CSR edge arrays and
+node coordinates) and the solutions found for them, replacing the pickle
+file of each graph and the copies of the graphs in the results directories.
+
+The file is a magic string, the length of a JSON header and the header,
+followed by the raw arrays of all the instances. The header has the
+position of every array in the file, so the file is memory-mapped and an
+instance is read without deserialising the others.
+
+Running this file converts the pickle files of the graphs and of the
+exhaustive search and greedy heuristic results into the corpus file."""
+
+import json
+import os
+import pickle
+
+import numpy as np
+
+from csr_graph import CSRGraph
+
+
+CORPUS_FILE = './graphs/corpus.bin'
+MAGIC = b'GCORPUS1'
+# Alignment of the arrays in the file, in bytes.
+ALIGNMENT = 8
+
+INDEX_DTYPE = np.dtype('<i8')
+COORDS_DTYPE = np.dtype('<f8')
+
+
+def instance_name(n_nodes, p):
+    """Returns the name of an instance, the same as the name of the pickle
+    file of the graph without the extension, e.g. 07nodes_p25."""
+    return f'{n_nodes:02d}nodes_p{p*100:.0f}'
+
+
+def write_corpus(instances, file=CORPUS_FILE):
+    """Writes the instances to the corpus file. Each instance is a dict with
+    the keys n_nodes, p, indptr, indices (the CSR arrays of the graph),
+    coords (array of shape (n_nodes, 2)) and solutions (dict from the name
+    of the algorithm to a tuple (chromatic_number, colours array)), and
+    optionally name (instance_name(n_nodes, p) if not given) and family
+    (the graph family, gnp if not given).
+    Instances are stored in non-decreasing order of (n_nodes, p).
+    The file is written to a temporary file which then replaces the old one,
+    so corpora already open keep reading the old file."""
+
+    instances = sorted(instances, key=lambda instance: (instance['n_nodes'],
+                                                        instance['p']))
+    header_instances = []
+    arrays = []
+    offset = 0
+
+    def add_array(array, dtype):
+        nonlocal offset
+        array = np.ascontiguousarray(array, dtype=dtype)
+        entry = [offset, array.size]
+        arrays.append(array)
+        offset += -(-array.nbytes // ALIGNMENT) * ALIGNMENT
+        return entry
+
+    for instance in instances:
+        header_instances.append({
+            'name': instance.get('name') or instance_name(instance['n_nodes'],
+                                                          instance['p']),
+            'family': instance.get('family', 'gnp'),
+            'n_nodes': instance['n_nodes'],
+            'p': instance['p'],
+            'indptr': add_array(instance['indptr'], INDEX_DTYPE),
+            'indices': add_array(instance['indices'], INDEX_DTYPE),
+            'coords': add_array(instance['coords'], COORDS_DTYPE),
+            'solutions': {
+                solver: {'chromatic_number': int(chromatic_number),
+                         'colours': add_array(colours, INDEX_DTYPE)}
+                for solver, (chromatic_number, colours)
+                in instance.get('solutions', {}).items()}})
+
+    header = json.dumps({'instances': header_instances}).encode('utf-8')
+    # Pad the header so the data section starts aligned.
+    header += b' ' * (-(len(MAGIC) + 8 + len(header)) % ALIGNMENT)
+
+    tmp_file = f'{file}.tmp'
+    with open(tmp_file, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, 'little'))
+        f.write(header)
+        for array in arrays:
+            f.write(array.tobytes())
+            f.write(b'\0' * (-array.nbytes % ALIGNMENT))
+    os.replace(tmp_file, file)
+
+
+class GraphCorpus:
+    """
+    Read access to the instances of a corpus file.
+
+    Instances are numbered 0..len(corpus)-1 in non-decreasing order of
+    number of nodes and then of edge probability p. The arrays returned
+    are read-only views of the memory-mapped file.
+    """
+
+    def __init__(self, file=CORPUS_FILE):
+        """
+        Parameters
+        ----------
+        file : the corpus file
+        """
+        self.file = file
+        with open(file, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{file} is not a graph corpus file')
+            header_len = int.from_bytes(f.read(8), 'little')
+            header = json.loads(f.read(header_len))
+        self.data_offset = len(MAGIC) + 8 + header_len
+        self.header = header['instances']
+        self.index = {(instance['n_nodes'], instance['p']): k
+                      for k, instance in enumerate(self.header)}
+        self.data = np.memmap(file, dtype=np.uint8, mode='r')
+
+    def __len__(self):
+        return len(self.header)
+
+    def _array(self, entry, dtype):
+        offset, size = entry
+        start = self.data_offset + offset
+        return self.data[start:start + size*dtype.itemsize].view(dtype)
+
+    def find(self, n_nodes, p):
+        """Returns the number of the instance with n_nodes nodes and edge
+        probability p."""
+        return self.index[(n_nodes, p)]
+
+    def instances(self, max_nodes=None):
+        """Returns the numbers of the instances with at most max_nodes
+        nodes (all the instances if not given)."""
+        return [k for k, instance in enumerate(self.header)
+                if max_nodes is None or instance['n_nodes'] <= max_nodes]
+
+    def name(self, k):
+        """Returns the name of instance k, e.g. 07nodes_p25."""
+        return self.header[k]['name']
+
+    def params(self, k):
+        """Returns the number of nodes and the edge probability p of
+        instance k."""
+        return self.header[k]['n_nodes'], self.header[k]['p']
+
+    def graph(self, k):
+        """Returns instance k as a CSRGraph."""
+        return CSRGraph(self._array(self.header[k]['indptr'], INDEX_DTYPE),
+                        self._array(self.header[k]['indices'], INDEX_DTYPE))
+
+    def adj_list(self, k):
+        """Returns the adjacency list (dict of lists) of instance k."""
+        return self.graph(k).to_adj_list()
+
+    def coords(self, k):
+        """Returns the (x, y) coordinates of the nodes of instance k,
+        as a dict from node to coordinates."""
+        coords = self._array(self.header[k]['coords'], COORDS_DTYPE)
+        return {node: tuple(xy) for node, xy
+                in enumerate(coords.reshape(-1, 2).tolist())}
+
+    def solvers(self, k):
+        """Returns the names of the algorithms with a solution stored for
+        instance k."""
+        return list(self.header[k]['solutions'])
+
+    def solution(self, k, solver):
+        """Returns the chromatic number found by solver for instance k and
+        the list with the colour of each node, or None if there is no
+        solution stored."""
+        solution = self.header[k]['solutions'].get(solver)
+        if solution is None:
+            return None
+        colours = self._array(solution['colours'], INDEX_DTYPE)
+        return solution['chromatic_number'], colours.tolist()
+
+    def instance(self, k):
+        """Returns instance k as a dict, in the format of write_corpus."""
+        header = self.header[k]
+        return {'name': header['name'],
+                'family': header.get('family', 'gnp'),
+                'n_nodes': header['n_nodes'],
+                'p': header['p'],
+                'indptr': self._array(header['indptr'], INDEX_DTYPE),
+                'indices': self._array(header['indices'], INDEX_DTYPE),
+                'coords': self._array(header['coords'],
+                                      COORDS_DTYPE).reshape(-1, 2),
+                'solutions': {solver: self.solution(k, solver)
+                              for solver in header['solutions']}}
+
+
+def instance_from_adj_list(n_nodes, p, adj_list, coords):
+    """Returns an instance in the format of write_corpus for a graph given
+    by its adjacency list and the dict with the coordinates of its nodes."""
+    graph = CSRGraph.from_adj_list(adj_list)
+    return {'n_nodes': n_nodes,
+            'p': p,
+            'indptr': graph.indptr,
+            'indices': graph.indices,
+            'coords': [coords[node] for node in range(n_nodes)],
+            'solutions': {}}
+
+
+def save_solutions(solver, solutions, file=CORPUS_FILE):
+    """Stores the solutions of solver in the corpus file. solutions is a
+    dict from instance number to a tuple (chromatic_number, colours), where
+    colours is a list or array with the colour of each node or a dict from
+    node to colour."""
+
+    corpus = GraphCorpus(file)
+    instances = [corpus.instance(k) for k in range(len(corpus))]
+    for k, (chromatic_number, colours) in solutions.items():
+        if isinstance(colours, dict):
+            colours = [colours[node] for node in range(len(colours))]
+        instances[k]['solutions'][solver] = (chromatic_number, colours)
+    write_corpus(instances, file)
+
+
+def convert_pickles(graphs_path='./graphs', results_path='./results',
+                    file=CORPUS_FILE):
+    """Writes the corpus file with the graphs in the pickle files of
+    graphs_path and the solutions in the directories of results_path."""
+
+    instances = []
+    for graph_file in os.listdir(graphs_path):
+        if not graph_file.endswith('.pkl'):
+            continue
+        with open(f'{graphs_path}/{graph_file}', 'rb') as f:
+            adj_list = pickle.load(f)
+            coords = pickle.load(f)
+        n_nodes = int(graph_file[:2])
+        p = int(graph_file[-6:-4]) / 100
+        instance = instance_from_adj_list(n_nodes, p, adj_list, coords)
+
+        for solver in sorted(os.listdir(results_path)):
+            solver_file = f'{results_path}/{solver}/{graph_file}'
+            if not os.path.exists(solver_file):
+                continue
+            with open(solver_file, 'rb') as f:
+                _ = pickle.load(f)
+                _ = pickle.load(f)
+                chromatic_number = pickle.load(f)
+                colours = pickle.load(f)
+            if isinstance(colours, dict):
+                colours = [colours[node] for node in range(n_nodes)]
+            instance['solutions'][solver] = (chromatic_number, colours)
+        instances.append(instance)
+
+    write_corpus(instances, file)
+    print(f'Wrote {len(instances)} graphs to {file}.')
+
+
+if __name__ == '__main__':
+    convert_pickles()
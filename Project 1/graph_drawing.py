@@ -1,54 +1,181 @@
 """Generate visual representations of the graph instances and the
-computed solutions."""
+computed solutions.
 
+Drawings are made with the object-oriented Matplotlib API on Agg canvases
+(no pyplot global figure), so several instances are drawn at the same time
+in a pool of processes. Each output directory keeps a manifest with a hash
+of what every drawing shows (the graph, its layout and its colouring), and
+drawings whose hash has not changed are not drawn again."""
 
-import matplotlib.pyplot as plt
-import networkx as nx
+from concurrent.futures import ProcessPoolExecutor
+import functools
+import hashlib
+import json
 import os
-import pickle
 
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+import numpy as np
 
-def batch_draw(path):
-    """Draw all graphs in path, colouring them if colours are saved."""
+from graph_corpus import CORPUS_FILE, GraphCorpus
 
-    for file in os.listdir(path):
-        if file[-4:] != '.pkl':
-            continue
-        with open(f'{path}/{file}', 'rb') as f:
-            adj_list = pickle.load(f)
-            coords = pickle.load(f)
-            try:
-                chromatic_number = pickle.load(f)
-                colours = pickle.load(f)
-            except EOFError:
-                chromatic_number = None
-                colours = 'k'
-        
-        if 'greedy' in path:
-            colours = [colours[node] for node in range(len(adj_list))]
 
-        if chromatic_number:
-            plt.title(f'Chromatic number: {chromatic_number}')
+# Changing the way graphs are drawn must change this, so all the drawings
+# are made again.
+DRAWING_VERSION = 1
+MANIFEST_FILE = '.drawings.json'
 
-        G = nx.Graph(adj_list)
-        nx.draw(G, pos=coords, node_color=colours, 
-                edge_color='grey', with_labels=True)
+# Same look as networkx.draw.
+NODE_SIZE = 300
+NODE_CMAP = 'viridis'
+EDGE_COLOUR = 'grey'
+UNCOLOURED = 'k'
 
-        plt.savefig(f'{path}/{file[:-4]}.png')
-        plt.clf()
 
+########## LAYOUT #############
 
-path = './results/exhaustive_v2'
-batch_draw(path)
+@functools.lru_cache(maxsize=64)
+def instance_geometry(corpus_file, k):
+    """Returns the positions of the nodes of instance k of the corpus, as an
+    array of shape (n_nodes, 2), and the segments of its edges, as an array
+    of shape (n_edges, 2, 2) for a LineCollection."""
 
+    corpus = GraphCorpus(corpus_file)
+    graph = corpus.graph(k)
+    coords = corpus.coords(k)
+    points = np.array([coords[node] for node in range(len(graph))],
+                      dtype=np.float64).reshape(-1, 2)
+    # Each edge once, from the CSR arrays.
+    nodes = np.repeat(np.arange(len(graph)), np.diff(graph.indptr))
+    once = nodes < graph.indices
+    segments = np.stack((points[nodes[once]], points[graph.indices[once]]),
+                        axis=1)
+    return points, segments
 
-# file = './graphs/13nodes_p50.pkl'
-# with open(file, 'rb') as f:
-#     adj_list = pickle.load(f)
-#     coords = pickle.load(f)
-# G = nx.Graph(adj_list)
-# nx.draw(G, pos=coords, node_color='grey', edge_color='k', with_labels=True) 
 
-# adj_str = '\n'.join([f'{node}: {adj_list[node]}' for node in adj_list])
-# plt.text(7.5, 0.4, adj_str, size=8)
-# plt.show()   
\ No newline at end of file
+def drawing_hash(corpus, k, solution):
+    """Returns a hash of the drawing of instance k of the corpus with the
+    solution (chromatic number, colours) or None."""
+
+    instance = corpus.instance(k)
+    h = hashlib.sha256(f'{DRAWING_VERSION}:{instance["name"]}'.encode('utf-8'))
+    for array in ('indptr', 'indices', 'coords'):
+        h.update(np.ascontiguousarray(instance[array]).tobytes())
+    if solution:
+        chromatic_number, colours = solution
+        h.update(f'{chromatic_number}:{list(colours)}'.encode('utf-8'))
+    return h.hexdigest()
+
+
+########## DRAWING #############
+
+def draw_instance(corpus_file, k, drawings):
+    """Draws instance k of the corpus once for each (colours, title, file)
+    in drawings, where colours is a list with the colour of each node or
+    None. The edges and labels are drawn once for all the files, and only
+    the colours of the nodes and the title change between them. Returns the
+    files written."""
+
+    points, segments = instance_geometry(corpus_file, k)
+
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot()
+    ax.set_axis_off()
+    ax.add_collection(LineCollection(segments, colors=EDGE_COLOUR, zorder=1))
+    nodes = ax.scatter(points[:, 0], points[:, 1], s=NODE_SIZE,
+                       c=UNCOLOURED, zorder=2)
+    for node, (x, y) in enumerate(points):
+        ax.text(x, y, str(node), ha='center', va='center', zorder=3)
+    ax.autoscale_view()
+
+    written = []
+    for colours, title, file in drawings:
+        if colours is None:
+            nodes.set_array(None)
+            nodes.set_facecolor(UNCOLOURED)
+        else:
+            nodes.set_cmap(NODE_CMAP)
+            nodes.set_array(np.asarray(colours, dtype=np.float64))
+            nodes.set_clim(min(colours), max(colours))
+        ax.set_title(title or '')
+        figure.savefig(file)
+        written.append(file)
+    return written
+
+
+def batch_draw_solvers(paths, corpus_file=CORPUS_FILE, workers=None,
+                       force=False):
+    """Draw all graphs of the corpus for several solvers at once. paths is
+    a dict from the name of a solver (or None for the graphs without
+    colours) to the directory where its drawings are saved. Graphs without
+    a solution of a solver are drawn without colours. Drawings that did not
+    change since the last time are skipped unless force is True. Returns
+    the number of drawings made."""
+
+    corpus = GraphCorpus(corpus_file)
+    manifests = {}
+    for solver, path in paths.items():
+        if not os.path.exists(path):
+            os.makedirs(path)
+        manifest_file = f'{path}/{MANIFEST_FILE}'
+        manifests[solver] = {}
+        if os.path.exists(manifest_file) and not force:
+            with open(manifest_file) as f:
+                manifests[solver] = json.load(f)
+
+    # Drawings to make, grouped by instance so each instance is laid out
+    # once for all the solvers.
+    jobs = {}
+    new_hashes = {}
+    for k in range(len(corpus)):
+        name = corpus.name(k)
+        for solver, path in paths.items():
+            solution = corpus.solution(k, solver) if solver else None
+            file = f'{path}/{name}.png'
+            digest = drawing_hash(corpus, k, solution)
+            if manifests[solver].get(name) == digest and os.path.exists(file):
+                continue
+            colours = title = None
+            if solution:
+                title = f'Chromatic number: {solution[0]}'
+                colours = solution[1]
+            jobs.setdefault(k, []).append((colours, title, file))
+            new_hashes[file] = (solver, name, digest)
+
+    n_drawn = 0
+    try:
+        if jobs:
+            with ProcessPoolExecutor(workers) as executor:
+                futures = [executor.submit(draw_instance, corpus_file, k,
+                                           drawings)
+                           for k, drawings in jobs.items()]
+                for future in futures:
+                    for file in future.result():
+                        solver, name, digest = new_hashes[file]
+                        manifests[solver][name] = digest
+                        n_drawn += 1
+    finally:
+        # Keep the drawings made even if some failed.
+        for solver, path in paths.items():
+            with open(f'{path}/{MANIFEST_FILE}', 'w') as f:
+                json.dump(manifests[solver], f, indent=1)
+    return n_drawn
+
+
+def batch_draw(path, solver=None, corpus_file=CORPUS_FILE, workers=None,
+               force=False):
+    """Draw all graphs of the corpus in path, colouring them with the
+    solutions of solver if given and saved in the corpus."""
+    return batch_draw_solvers({solver: path}, corpus_file, workers, force)
+
+
+if __name__ == '__main__':
+    n_drawn = batch_draw('./results/exhaustive_v2', 'exhaustive_v2')
+    print(f'Drew {n_drawn} graphs.')
+
+
+# corpus = GraphCorpus()
+# k = corpus.find(13, 0.5)
+# draw_instance(CORPUS_FILE, k, [(None, None, f'./{corpus.name(k)}.png')])
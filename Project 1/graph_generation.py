@@ -1,12 +1,13 @@
 """Generate the graph files to be used on the computational experiments.
-Graphs are stored in the chosen directory, as pickle files containing
-the adjacency list and the coordinates of the nodes of each graph."""
+Graphs are stored in the graph corpus file, with the adjacency list
+and the coordinates of the nodes of each graph."""
 
 import networkx as nx
-import pickle
 import os
 import random
 
+from graph_corpus import CORPUS_FILE, instance_from_adj_list, write_corpus
+
 
 def generate_coords(n_nodes):
     """Generate a set of different (x, y) coordinates for the nodes.
@@ -58,6 +59,7 @@ GRAPH_PATH = './graphs'
 random.seed(SEED)
 if not os.path.exists(GRAPH_PATH):
     os.makedirs(GRAPH_PATH)
+instances = []
 
 for edge_percentage in EDGE_PERCENTAGES:
     print('\n   ######################################')
@@ -75,8 +77,7 @@ for edge_percentage in EDGE_PERCENTAGES:
         print(f'Generated graph with {n_nodes:<2} nodes and {n_edges:^3} edges' + 
         f' ({n_edges/max_edges*100:.2f}% of max edges).')
         
-        str_n_nodes = str(n_nodes).zfill(2)
-        str_p = f'{edge_percentage*100:.0f}'
-        with open(f'{GRAPH_PATH}/{str_n_nodes}nodes_p{str_p}.pkl', 'wb') as f:
-            pickle.dump(adj_list, f)
-            pickle.dump(coords, f)
\ No newline at end of file
+        instances.append(instance_from_adj_list(n_nodes, edge_percentage,
+                                                adj_list, coords))
+
+write_corpus(instances, CORPUS_FILE)
\ No newline at end of file
@@ -1,17 +1,26 @@
 """Tests a greedy heuristic algorithm for finding the chromatic number
 of the previously generated graphs.
-Creates a pickle file containing the adjacency list, the coordinates of the nodes,
-the chromatic number and an optimal colouring solution for each graph. 
+Stores the chromatic number and the colouring solution found for each
+graph in the graph corpus file.
 Also saves the empirical complexity data from running the algorithm for all
 the graphs in a pickle file."""
 
-import os
+import heapq
 import pickle
+import random
 import time
 
+import numpy as np
+
+from bitset_graph import BitsetGraph
+from graph_corpus import GraphCorpus, save_solutions
+from instrumentation import count_operations, instrumented
+from result_cache import ResultCache
+
 ########## GREEDY HEURISTIC ALGORITHM #############
 
-def chromatic_number_greedy(adj_list):
+@instrumented('n_membership_checks')
+def chromatic_number_greedy(adj_list, *, counters=None):
     """Returns the chromatic number of a given undirected graph
     represented by its adjacency list and one possible colour combination
     to obtain it."""
@@ -19,33 +28,330 @@ def chromatic_number_greedy(adj_list):
     # Colours each node with the smallest colour that has not been given to 
     # its neighbours. 
 
-    global n_membership_checks
-
     n_nodes = len(adj_list)
     # Sort nodes in non-increasing order of degree:
-    nodes = sorted(adj_list, key=lambda node: len(adj_list[node]), reverse=True)
+    with counters.phase('ordering'):
+        nodes = sorted(adj_list, key=lambda node: len(adj_list[node]), 
+                       reverse=True)
     
     colours = {} 
                                 
+    with counters.phase('colouring'):
+        for node in nodes:
+            # Store the different colours of the current node's neighbours:
+            neighbour_colours = set() 
+            for neighbour in adj_list[node]:
+                counters.n_membership_checks += 1
+                if neighbour in colours:
+                    neighbour_colours.add(colours[neighbour])
+            
+            for colour in range(n_nodes):
+                counters.n_membership_checks += 1
+                if colour not in neighbour_colours:
+                    colours[node] = colour
+                    break
+    
+    chromatic_number = len(set(colours.values()))
+
+    return chromatic_number, colours
+
+
+@instrumented('n_membership_checks')
+def chromatic_number_greedy_bitset(graph, *, counters=None):
+    """Same as chromatic_number_greedy, for a BitsetGraph."""
+    # Keeps the bitmask of the nodes with each colour, so checking if a
+    # colour was given to any neighbour of a node is one AND.
+
+    with counters.phase('ordering'):
+        nodes = sorted(range(graph.n_nodes), key=graph.degree, reverse=True)
+    neighbours = graph.neighbours
+
+    colours = {}
+    colour_classes = []
+
+    with counters.phase('colouring'):
+        for node in nodes:
+            for colour, colour_class in enumerate(colour_classes):
+                counters.n_membership_checks += 1
+                if not neighbours[node] & colour_class:
+                    break
+            else:
+                colour = len(colour_classes)
+                colour_classes.append(0)
+            colours[node] = colour
+            colour_classes[colour] |= 1 << node
+
+    chromatic_number = len(colour_classes)
+
+    return chromatic_number, colours
+
+
+@instrumented('n_membership_checks')
+def chromatic_number_greedy_csr(graph, *, counters=None):
+    """Same as chromatic_number_greedy, for a CSRGraph, for graphs too large
+    for an adjacency list. The colouring is an array with the colour of
+    each node."""
+    # Only the graph is kept in NumPy arrays. The loop over the nodes can not
+    # be vectorised, and indexing NumPy arrays one element at a time is 
+    # slower than indexing lists, so the colours (-1 for uncoloured nodes) 
+    # and the neighbours of the current node are kept in lists.
+    # The colours of the neighbours of a node are marked in the forbidden 
+    # list by writing the node there. Marks of previous nodes are simply not
+    # equal to the current node, so the list is never cleared. The last 
+    # slot of the list takes the marks of the uncoloured neighbours.
+
+    degrees = graph.degrees()
+    # Stable sort, so nodes of equal degree are in the same order as in
+    # chromatic_number_greedy.
+    with counters.phase('ordering'):
+        nodes = np.argsort(-degrees, kind='stable').tolist()
+    indptr = graph.indptr.tolist()
+    indices = graph.indices
+
+    colours = [-1] * graph.n_nodes
+    # A node of degree d gets one of the colours 0..d.
+    forbidden = [-1] * (int(degrees.max(initial=0)) + 2)
+
+    with counters.phase('colouring'):
+        for node in nodes:
+            start, end = indptr[node], indptr[node + 1]
+            for neighbour in indices[start:end].tolist():
+                forbidden[colours[neighbour]] = node
+            colour = 0
+            while forbidden[colour] == node:
+                colour += 1
+            colours[node] = colour
+            counters.n_membership_checks += end - start + colour + 1
+
+    chromatic_number = max(colours, default=-1) + 1
+
+    return chromatic_number, np.array(colours, dtype=np.int64)
+
+
+def greedy_clique(adj_list):
+    """Returns a clique (list of mutually adjacent nodes) of a given 
+    undirected graph represented by its adjacency list. The clique is not 
+    necessarily maximum, but its size is a lower bound for the chromatic 
+    number."""
+    # Grows a clique from every node, adding the remaining nodes in 
+    # non-increasing order of degree whenever they are adjacent to all 
+    # the nodes already in the clique. Keeps the largest clique found.
+
+    nodes = sorted(adj_list, key=lambda node: len(adj_list[node]), reverse=True)
+    neighbours = {node: set(adj_list[node]) for node in adj_list}
+    best_clique = []
+
+    for start in nodes:
+        if len(neighbours[start]) < len(best_clique):
+            # Cannot grow a larger clique from this node.
+            continue
+        clique = [start]
+        candidates = set(neighbours[start])
+        for node in nodes:
+            if node in candidates:
+                clique.append(node)
+                candidates &= neighbours[node]
+        if len(clique) > len(best_clique):
+            best_clique = clique
+
+    return best_clique
+
+
+########## GREEDY HEURISTIC WITH DIFFERENT ORDERINGS #############
+
+def order_largest_first(adj_list, rng=None):
+    """Nodes in non-increasing order of degree."""
+    return sorted(adj_list, key=lambda node: len(adj_list[node]), reverse=True)
+
+
+def order_smallest_last(adj_list, rng=None):
+    """Nodes in smallest-last order: the last node has the smallest degree,
+    the one before it has the smallest degree once the last node is removed,
+    and so on."""
+
+    degree = {node: len(adj_list[node]) for node in adj_list}
+    # buckets[d] has the nodes not yet removed with degree d.
+    buckets = [set() for _ in range(max(degree.values(), default=0) + 1)]
+    for node in adj_list:
+        buckets[degree[node]].add(node)
+
+    removed = set()
+    nodes = []
+    min_degree = 0
+    for _ in range(len(adj_list)):
+        # Removing a node decreases the degree of its neighbours by one.
+        min_degree = max(min_degree - 1, 0)
+        while not buckets[min_degree]:
+            min_degree += 1
+        node = buckets[min_degree].pop()
+        removed.add(node)
+        nodes.append(node)
+        for neighbour in adj_list[node]:
+            if neighbour not in removed:
+                buckets[degree[neighbour]].remove(neighbour)
+                degree[neighbour] -= 1
+                buckets[degree[neighbour]].add(neighbour)
+
+    nodes.reverse()
+    return nodes
+
+
+def order_random(adj_list, rng=None):
+    """Nodes in random order."""
+    nodes = list(adj_list)
+    (rng or random).shuffle(nodes)
+    return nodes
+
+
+@instrumented('n_membership_checks')
+def greedy_colouring(adj_list, nodes, *, counters=None):
+    """Colours the nodes in the given order, each one with the smallest 
+    colour not given to its neighbours. Returns a dict with the colour of 
+    each node."""
+    # forbidden[colour] == node if a neighbour of node has that colour, so
+    # the list is reused for all nodes without being cleared.
+
+    colours = {}
+    forbidden = [None] * (len(adj_list) + 1)
+
     for node in nodes:
-        # Store the different colours of the current node's neighbours:
-        neighbour_colours = set() 
         for neighbour in adj_list[node]:
-            n_membership_checks += 1
+            counters.n_membership_checks += 1
             if neighbour in colours:
-                neighbour_colours.add(colours[neighbour])
-        
-        for colour in range(n_nodes):
-            n_membership_checks += 1
-            if colour not in neighbour_colours:
+                forbidden[colours[neighbour]] = node
+        colour = 0
+        while forbidden[colour] == node:
+            counters.n_membership_checks += 1
+            colour += 1
+        colours[node] = colour
+
+    return colours
+
+
+@instrumented('n_membership_checks')
+def colour_dsatur(adj_list, rng=None, *, counters=None):
+    """Colours the nodes in DSATUR order: the next node is always the one 
+    whose neighbours already have the largest number of different colours
+    (ties broken by degree), with the smallest colour not given to its 
+    neighbours. Returns a dict with the colour of each node."""
+
+    colours = {}
+    neighbour_colours = {node: set() for node in adj_list}
+    # Heap of (-saturation, -degree, node), with outdated entries skipped.
+    heap = [(0, -len(adj_list[node]), node) for node in adj_list]
+    heapq.heapify(heap)
+
+    while heap:
+        _, _, node = heapq.heappop(heap)
+        if node in colours:
+            continue
+        colour = 0
+        while colour in neighbour_colours[node]:
+            counters.n_membership_checks += 1
+            colour += 1
+        colours[node] = colour
+        for neighbour in adj_list[node]:
+            counters.n_membership_checks += 1
+            if neighbour in colours or colour in neighbour_colours[neighbour]:
+                continue
+            neighbour_colours[neighbour].add(colour)
+            heapq.heappush(heap, (-len(neighbour_colours[neighbour]),
+                                  -len(adj_list[neighbour]), neighbour))
+
+    return colours
+
+
+@instrumented('n_membership_checks')
+def colour_welsh_powell(adj_list, rng=None, *, counters=None):
+    """Colours the nodes with the Welsh-Powell algorithm: goes through the 
+    nodes in non-increasing order of degree giving the first colour to every
+    node not adjacent to a node with that colour, then does the same with
+    the second colour for the nodes left, and so on. Returns a dict with 
+    the colour of each node."""
+
+    uncoloured = order_largest_first(adj_list)
+    colours = {}
+    colour = 0
+    while uncoloured:
+        coloured = set()
+        left = []
+        for node in uncoloured:
+            counters.n_membership_checks += 1
+            if coloured.isdisjoint(adj_list[node]):
                 colours[node] = colour
-                break
-    
+                coloured.add(node)
+            else:
+                left.append(node)
+        uncoloured = left
+        colour += 1
+
+    return colours
+
+
+# Orderings that can be given to chromatic_number_greedy_ordered, either
+# functions returning the order of the nodes or functions colouring the
+# nodes in an order found while colouring.
+ORDERINGS = {'largest_first': order_largest_first,
+             'smallest_last': order_smallest_last,
+             'random': order_random}
+COLOURINGS = {'dsatur': colour_dsatur,
+              'welsh_powell': colour_welsh_powell}
+
+
+@instrumented('n_membership_checks')
+def chromatic_number_greedy_ordered(adj_list, ordering='largest_first', 
+                                    rng=None, *, counters=None):
+    """Returns the chromatic number of a given undirected graph
+    represented by its adjacency list and one possible colour combination
+    to obtain it, found by colouring the nodes greedily in the given
+    ordering (a name in ORDERINGS or COLOURINGS, or a function of the
+    adjacency list returning the nodes in order)."""
+
+    if ordering in COLOURINGS:
+        with counters.phase('colouring'):
+            colours = COLOURINGS[ordering](adj_list, rng, counters=counters)
+    else:
+        with counters.phase('ordering'):
+            if callable(ordering):
+                nodes = ordering(adj_list)
+            else:
+                nodes = ORDERINGS[ordering](adj_list, rng)
+        with counters.phase('colouring'):
+            colours = greedy_colouring(adj_list, nodes, counters=counters)
+
     chromatic_number = len(set(colours.values()))
 
     return chromatic_number, colours
 
 
+@instrumented('n_membership_checks')
+def chromatic_number_greedy_portfolio(adj_list, 
+        orderings=('dsatur', 'smallest_last', 'largest_first', 'welsh_powell'),
+        n_restarts=20, lower_bound=None, seed=None, *, counters=None):
+    """Returns the chromatic number of a given undirected graph
+    represented by its adjacency list and one possible colour combination
+    to obtain it."""
+    # Runs the greedy heuristic with each of the orderings and then with
+    # n_restarts random orderings, keeping the colouring with less colours.
+    # Stops as soon as the colouring uses lower_bound colours (the size of
+    # a greedily found clique if not given), since it must be optimal.
+
+    rng = random.Random(seed)
+    if lower_bound is None:
+        lower_bound = len(greedy_clique(adj_list))
+
+    best = None
+    for ordering in list(orderings) + ['random'] * n_restarts:
+        chromatic_number, colours = chromatic_number_greedy_ordered(
+            adj_list, ordering, rng, counters=counters)
+        if best is None or chromatic_number < best[0]:
+            best = chromatic_number, colours
+        if best[0] <= lower_bound:
+            break
+
+    return best
+
+
 ########## GREEDY HEURISTIC TESTING #############
 
 def save_complexity_data(data):
@@ -55,52 +361,61 @@ def save_complexity_data(data):
 
 
 def run_tests(func = chromatic_number_greedy, max_nodes = 20):
-    global n_membership_checks
     try:
         empirical_analysis = {}
+        cache = ResultCache()
         chromatic_number_func = func
-        results_path = f'./results/greedy'
+        solver = func.__name__.removeprefix('chromatic_number_')
+        corpus = GraphCorpus()
+        solutions = {}
 
         print('Running greedy heuristic for all graphs, using {func_name}.\n')
 
-        if not os.path.exists(results_path):
-            os.makedirs(results_path)
-
-        for file in os.listdir('./graphs/'):
-            if int(file[:2]) > max_nodes:
-                break
-            if file.endswith('.png'):
-                continue
-
+        for k in corpus.instances(max_nodes):
+            file = f'{corpus.name(k)}.pkl'
             print(f'Searching graph {file[:-3]}...', end='', flush=True)
-            with open(f'./graphs/{file}', 'rb') as f:
-                adj_list = pickle.load(f)
-                coords = pickle.load(f)    
+            adj_list = corpus.adj_list(k)
+            if func.__name__.endswith('_bitset'):
+                graph = BitsetGraph.from_adj_list(adj_list)
+            elif func.__name__.endswith('_csr'):
+                graph = corpus.graph(k)
+            else:
+                graph = adj_list
             
-            t_start = time.time()
-            n_runs = 10000
-            for _ in range(n_runs):
-                n_membership_checks = 0
-                chromatic_number, best_colours = chromatic_number_func(adj_list)
-            t_end = time.time()
-            elapsed_time = (t_end - t_start) / n_runs
+            cached = cache.get(adj_list, func.__name__)
+            if cached:
+                chromatic_number = cached['chromatic_number']
+                best_colours = cached['colours']
+                empirical_analysis[file] = cached['analysis']
+                print(' CACHED')
+            else:
+                t_start = time.time()
+                n_runs = 10000
+                for _ in range(n_runs):
+                    chromatic_number, best_colours = chromatic_number_func(graph)
+                t_end = time.time()
+                elapsed_time = (t_end - t_start) / n_runs
 
-            print(f' DONE in {1000*elapsed_time:.3f} ms')
+                print(f' DONE in {1000*elapsed_time:.3f} ms')
 
-            empirical_analysis[file] = {'n_membership_checks': n_membership_checks,
-                                        'e_time': elapsed_time}
+                _, counters = count_operations(chromatic_number_func, graph)
+                empirical_analysis[file] = {**counters.as_dict(),
+                                            'e_time': elapsed_time}
+                cache.put(adj_list, func.__name__, chromatic_number, 
+                          best_colours, empirical_analysis[file])
 
-            with open(f'{results_path}/{file}', 'wb') as f:
-                pickle.dump(adj_list, f)
-                pickle.dump(coords, f)
-                pickle.dump(chromatic_number, f)
-                pickle.dump(best_colours, f)
+            solutions[k] = (chromatic_number, best_colours)
 
         save_complexity_data(empirical_analysis)
+        save_solutions(solver, solutions)
+        cache.save()
             
     except KeyboardInterrupt:
         print(' CANCELLED')
         save_complexity_data()
+        save_solutions(solver, solutions)
+        cache.save()
+
 
-n_membership_checks = 0
-run_tests()
\ No newline at end of file
+if __name__ == '__main__':
+    run_tests()
@@ -0,0 +1,222 @@
+"""Counting of the elementary operations and timing of the phases of the
+chromatic number algorithms, for the empirical complexity analysis.
+
+Algorithms decorated with @instrumented take an optional keyword argument
+counters (a Counters object). Inside them, operations are counted with
+statements like
+
+    counters.n_comparisons += 1
+
+and the phases are timed with
+
+    with counters.phase('search'):
+        ...
+
+The decorator compiles a second copy of the function from its source with
+all these statements removed (and with the instrumented functions it calls
+replaced by their copies without counters), which is the one run when no
+counters are given. So runs without counters do not pay anything for the
+instrumentation, and runs with counters do not share any global state."""
+
+import ast
+from contextlib import contextmanager
+import functools
+import inspect
+import textwrap
+import time
+
+
+class Counters:
+    """
+    Operation counts and phase times of the runs of an algorithm.
+
+    Counts are attributes whose name starts with n_, which start at 0 the
+    first time they are incremented. Phase times are in seconds and add up
+    over all the times a phase is entered.
+    """
+
+    def __init__(self, *names):
+        """
+        Parameters
+        ----------
+        names : names of the counts that are always reported, even if the
+            algorithm does not increment them
+        """
+        for name in names:
+            setattr(self, name, 0)
+        self.phase_times = {}
+
+    def __getattr__(self, name):
+        # Only called for the counts not incremented yet.
+        if name.startswith('n_'):
+            return 0
+        raise AttributeError(name)
+
+    @contextmanager
+    def phase(self, name):
+        """Adds the time spent inside the with block to the phase name."""
+        t_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] = (self.phase_times.get(name, 0)
+                                      + time.perf_counter() - t_start)
+
+    def counts(self):
+        """Returns a dict with the value of every count."""
+        return {name: value for name, value in vars(self).items()
+                if name.startswith('n_')}
+
+    def as_dict(self):
+        """Returns the counts and the phase times, in the format of the
+        empirical complexity data saved by the testing code."""
+        return {**self.counts(), 'phase_times': dict(self.phase_times)}
+
+
+class _RemoveCounters(ast.NodeTransformer):
+    """Removes from a function the statements and arguments using the
+    counters, and replaces the calls to instrumented functions by calls to
+    their versions without counters."""
+
+    def __init__(self, module_globals):
+        self.module_globals = module_globals
+
+    @staticmethod
+    def _uses_counters(node):
+        return any(isinstance(child, ast.Name) and child.id == 'counters'
+                   for child in ast.walk(node))
+
+    def _visit_body(self, body):
+        new_body = []
+        for statement in body:
+            result = self.visit(statement)
+            if result is None:
+                continue
+            new_body.extend(result if isinstance(result, list) else [result])
+        return new_body or [ast.Pass()]
+
+    def generic_visit(self, node):
+        for field, value in ast.iter_fields(node):
+            if isinstance(value, list):
+                if value and isinstance(value[0], ast.stmt):
+                    setattr(node, field, self._visit_body(value))
+                else:
+                    setattr(node, field, [self.visit(item)
+                                          if isinstance(item, ast.AST)
+                                          else item for item in value])
+            elif isinstance(value, ast.AST):
+                setattr(node, field, self.visit(value))
+        return node
+
+    def visit_FunctionDef(self, node):
+        node.decorator_list = []
+        return self.generic_visit(node)
+
+    def visit_arguments(self, node):
+        # counters is always a keyword-only argument.
+        kept = [(arg, default) for arg, default
+                in zip(node.kwonlyargs, node.kw_defaults)
+                if arg.arg != 'counters']
+        node.kwonlyargs = [arg for arg, _ in kept]
+        node.kw_defaults = [default for _, default in kept]
+        return self.generic_visit(node)
+
+    def visit_AugAssign(self, node):
+        if self._uses_counters(node.target):
+            return None
+        return self.generic_visit(node)
+
+    def visit_Assign(self, node):
+        if any(self._uses_counters(target) for target in node.targets):
+            return None
+        return self.generic_visit(node)
+
+    def visit_Expr(self, node):
+        return None if self._uses_counters(node) else self.generic_visit(node)
+
+    def visit_With(self, node):
+        items = [item for item in node.items
+                 if not self._uses_counters(item.context_expr)]
+        body = self._visit_body(node.body)
+        if not items:
+            return body
+        node.items = items
+        node.body = body
+        return node
+
+    def visit_Call(self, node):
+        node.keywords = [keyword for keyword in node.keywords
+                         if keyword.arg != 'counters']
+        node = self.generic_visit(node)
+        # Only direct calls are replaced: instrumented functions used as
+        # values (default arguments, arguments of other functions) must stay
+        # the module-level functions, which can be pickled.
+        value = (self.module_globals.get(node.func.id)
+                 if isinstance(node.func, ast.Name) else None)
+        if hasattr(value, 'uninstrumented'):
+            node.func = ast.copy_location(
+                ast.Attribute(value=node.func, attr='uninstrumented',
+                              ctx=ast.Load()), node.func)
+        return node
+
+
+def without_counters(func):
+    """Returns a copy of func compiled from its source without the
+    statements and arguments using the counters."""
+
+    source = textwrap.dedent(inspect.getsource(func))
+    tree = ast.parse(source)
+    tree = ast.fix_missing_locations(_RemoveCounters(func.__globals__).visit(tree))
+    ast.increment_lineno(tree, func.__code__.co_firstlineno - 1)
+    namespace = {}
+    exec(compile(tree, inspect.getsourcefile(func), 'exec'),
+         func.__globals__, namespace)
+    return namespace[func.__name__]
+
+
+def instrumented(*counter_names):
+    """Decorator for the algorithms with counters. counter_names are the
+    counts the algorithm always reports."""
+
+    def decorator(func):
+        uninstrumented = without_counters(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, counters=None, **kwargs):
+            if counters is None:
+                return uninstrumented(*args, **kwargs)
+            return func(*args, counters=counters, **kwargs)
+
+        wrapper.instrumented = func
+        wrapper.uninstrumented = uninstrumented
+        wrapper.counter_names = counter_names
+        return wrapper
+
+    return decorator
+
+
+def bind_counters(func, *, counters=None):
+    """Returns the function to call many times in place of func, which may
+    be instrumented: its copy without counters if no counters are given, or
+    its version with counters with these counters bound, so the calls do not
+    go through the decorator. Other functions are returned unchanged.
+    Called as bind_counters(func, counters=counters) inside an instrumented
+    algorithm, its copy without counters always gets the copy of func."""
+    if not hasattr(func, 'instrumented'):
+        return func
+    if counters is None:
+        return func.uninstrumented
+    return functools.partial(func.instrumented, counters=counters)
+
+
+def count_operations(func, *args, **kwargs):
+    """Runs func with new counters and returns its result and the counters.
+    Functions without counters are just run."""
+
+    counters = Counters(*getattr(func, 'counter_names', ()))
+    if hasattr(func, 'instrumented'):
+        result = func(*args, counters=counters, **kwargs)
+    else:
+        with counters.phase('total'):
+            result = func(*args, **kwargs)
+    return result, counters
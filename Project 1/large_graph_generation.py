@@ -0,0 +1,286 @@
+"""Generate large graphs (up to hundreds of thousands of nodes) for
+benchmarking the algorithms on instances far beyond the exhaustive search.
+All the edges are generated with NumPy, in time proportional to the number
+of nodes and edges, and the graphs are stored in a graph corpus file.
+
+Graph families:
+    gnp       - Erdős–Rényi G(n, p) graphs, like graph_generation.py
+    geometric - random geometric graphs, nodes at random points of the unit
+                square joined if they are closer than a given radius
+    planted   - G(n, p) graphs without the edges joining nodes of the same
+                colour of a random colouring with k colours, so their
+                chromatic number is at most k
+    power_law - graphs with a power-law degree distribution (Chung-Lu model)"""
+
+import math
+import os
+import time
+
+import numpy as np
+
+from csr_graph import CSRGraph
+from graph_corpus import write_corpus
+
+
+########## EDGE GENERATION #############
+
+def pair_from_index(index):
+    """Returns the pairs of nodes (u, v), u < v, with the given positions in
+    the list of all pairs ordered by v and then by u:
+    (0, 1), (0, 2), (1, 2), (0, 3), (1, 3), (2, 3), ..."""
+    # Pair (u, v) is at position v(v-1)/2 + u, so v is the largest integer
+    # with v(v-1)/2 <= index. The square root can be one off for large
+    # indices, which is corrected afterwards.
+
+    index = np.asarray(index, dtype=np.int64)
+    v = ((1 + np.sqrt(1 + 8*index.astype(np.float64))) // 2).astype(np.int64)
+    v -= v*(v - 1)//2 > index
+    v += (v + 1)*v//2 <= index
+    u = index - v*(v - 1)//2
+    return np.stack((u, v), axis=1)
+
+
+def gnp_edges(n_nodes, p, rng):
+    """Returns the edges of a G(n, p) graph as an array of shape
+    (n_edges, 2)."""
+    # Instead of deciding for each of the n(n-1)/2 pairs if it is an edge,
+    # draws the number of pairs skipped until the next edge, which follows
+    # a geometric distribution. Only O(n_edges) random numbers are drawn.
+
+    n_pairs = n_nodes*(n_nodes - 1)//2
+    if p <= 0 or n_pairs == 0:
+        return np.empty((0, 2), dtype=np.int64)
+
+    positions = []
+    last = -1
+    while last < n_pairs:
+        # Enough skips for all the remaining edges with high probability.
+        n_skips = int(1.1*p*(n_pairs - last)) + 100
+        block = last + np.cumsum(rng.geometric(p, size=n_skips))
+        positions.append(block[block < n_pairs])
+        last = block[-1]
+
+    return pair_from_index(np.concatenate(positions))
+
+
+def geometric_edges(points, radius):
+    """Returns the edges joining the points (array of shape (n_nodes, 2) in
+    the unit square) closer than radius, as an array of shape (n_edges, 2)."""
+    # Divides the square in cells of side radius, so the points closer than
+    # radius to a point are in its cell or in one of the 8 cells around it.
+    # Points are sorted by cell, and each point is compared with the points
+    # of its cell after it and with all the points of 4 of the cells around
+    # it (the other 4 cells compare their points with it).
+
+    n_cells = max(1, int(1 / radius))
+    cell_x = np.minimum((points[:, 0] * n_cells).astype(np.int64), n_cells-1)
+    cell_y = np.minimum((points[:, 1] * n_cells).astype(np.int64), n_cells-1)
+    cell = cell_x*n_cells + cell_y
+    order = np.argsort(cell, kind='stable')
+    cell_x, cell_y, cell = cell_x[order], cell_y[order], cell[order]
+    cell_start = np.zeros(n_cells*n_cells + 1, dtype=np.int64)
+    np.cumsum(np.bincount(cell, minlength=n_cells*n_cells),
+              out=cell_start[1:])
+
+    sorted_points = points[order]
+    positions = np.arange(len(points))
+    edges = []
+    for dx, dy in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+        x, y = cell_x + dx, cell_y + dy
+        valid = (x < n_cells) & (y >= 0) & (y < n_cells)
+        neighbour_cell = np.where(valid, x*n_cells + y, 0)
+        start = np.where(valid, cell_start[neighbour_cell], 0)
+        end = np.where(valid, cell_start[neighbour_cell + 1], 0)
+        if dx == dy == 0:
+            start = positions + 1
+
+        # All the pairs (i, j) with start[i] <= j < end[i].
+        counts = np.maximum(end - start, 0)
+        i = np.repeat(positions, counts)
+        j = (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts,
+                                                 counts)
+             + np.repeat(start, counts))
+        distance = np.linalg.norm(sorted_points[i] - sorted_points[j], axis=1)
+        close = distance < radius
+        edges.append(np.stack((order[i[close]], order[j[close]]), axis=1))
+
+    return np.concatenate(edges)
+
+
+def power_law_edges(n_nodes, average_degree, exponent, rng):
+    """Returns the edges of a graph whose expected degrees follow a power
+    law with the given exponent, as an array of shape (n_edges, 2)."""
+    # Chung-Lu model: node i has weight w_i proportional to
+    # (i+1)^(-1/(exponent-1)) and the end nodes of the edges are drawn with
+    # probability proportional to the weights, so the expected degree of
+    # node i is proportional to w_i. Self loops and repeated edges are
+    # removed.
+
+    weights = np.arange(1, n_nodes + 1) ** (-1 / (exponent - 1))
+    weights /= weights.sum()
+    n_edges = int(n_nodes * average_degree / 2)
+    edges = rng.choice(n_nodes, size=(n_edges, 2), p=weights)
+    return edges[edges[:, 0] != edges[:, 1]]
+
+
+def unique_edges(edges):
+    """Returns the edges stored once, as (smaller node, larger node), and
+    sorted."""
+    return np.unique(np.sort(edges, axis=1), axis=0)
+
+
+########## CONNECTIVITY #############
+
+def connected_components(n_nodes, edges):
+    """Returns the label of the connected component of each node (the root
+    of its tree in a union-find structure), in a single pass over the
+    edges."""
+
+    parent = list(range(n_nodes))
+
+    def find(node):
+        while parent[node] != node:
+            # Path halving.
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for u, v in edges.tolist():
+        root_u, root_v = find(u), find(v)
+        if root_u != root_v:
+            parent[root_u] = root_v
+
+    return np.array([find(node) for node in range(n_nodes)], dtype=np.int64)
+
+
+def connecting_edges(n_nodes, edges, rng, colours=None, n_colours=None):
+    """Returns the edges to add to make the graph connected: one edge from
+    a random node of each connected component to a random node of the
+    largest one. If colours is given (a colouring with n_colours colours),
+    the added edges only join nodes of different colours, so the colouring
+    stays valid."""
+
+    labels = connected_components(n_nodes, edges)
+    roots, sizes = np.unique(labels, return_counts=True)
+    if len(roots) == 1:
+        return np.empty((0, 2), dtype=np.int64)
+
+    # A random node of each component other than the largest one.
+    order = np.argsort(labels, kind='stable')
+    starts = np.cumsum(sizes) - sizes
+    largest = np.argmax(sizes)
+    connected = order[starts[largest]:starts[largest] + sizes[largest]]
+    others = np.arange(len(sizes)) != largest
+    nodes = order[starts[others]
+                  + (rng.random(others.sum()) * sizes[others]).astype(np.int64)]
+
+    if colours is None:
+        targets = connected[rng.integers(0, len(connected), size=len(nodes))]
+    else:
+        targets = np.empty_like(nodes)
+        for colour in range(n_colours):
+            with_colour = colours[nodes] == colour
+            candidates = connected[colours[connected] != colour]
+            if len(candidates) == 0:
+                # The largest component is a single node, and so are the
+                # others (components with edges have nodes of two colours),
+                # so their nodes can take any other colour.
+                colours[nodes[with_colour]] = (colour + 1) % n_colours
+                candidates = connected
+            targets[with_colour] = candidates[
+                rng.integers(0, len(candidates), size=with_colour.sum())]
+
+    return np.stack((nodes, targets), axis=1)
+
+
+########## LAYOUT #############
+
+def grid_coords(n_nodes, rng):
+    """Returns (x, y) coordinates for the nodes at random points of a grid
+    with about twice as many points as nodes in each direction, so no two
+    nodes are nearest neighbours on the grid, like in graph_generation.py."""
+
+    side = math.ceil(math.sqrt(n_nodes))
+    cells = rng.permutation(side*side)[:n_nodes]
+    return np.stack((2*(cells // side) + 1, 2*(cells % side) + 1),
+                    axis=1).astype(np.float64)
+
+
+########## GRAPH GENERATION #############
+
+def generate_graph(family, n_nodes, rng, p=None, radius=None, k=None,
+                   average_degree=None, exponent=2.5):
+    """Returns a connected graph of the given family as an instance for
+    write_corpus. The parameters used depend on the family: p for gnp,
+    radius for geometric, k and p for planted and average_degree and
+    exponent for power_law. Planted graphs store their planted colouring
+    as a solution."""
+
+    colours = None
+    coords = grid_coords(n_nodes, rng)
+    if family == 'gnp':
+        edges = gnp_edges(n_nodes, p, rng)
+    elif family == 'geometric':
+        points = rng.random((n_nodes, 2))
+        edges = geometric_edges(points, radius)
+        coords = points * 2*math.ceil(math.sqrt(n_nodes))
+    elif family == 'planted':
+        colours = rng.integers(0, k, size=n_nodes)
+        edges = gnp_edges(n_nodes, p, rng)
+        edges = edges[colours[edges[:, 0]] != colours[edges[:, 1]]]
+    elif family == 'power_law':
+        edges = power_law_edges(n_nodes, average_degree, exponent, rng)
+    else:
+        raise ValueError(f'Unknown graph family: {family}')
+
+    edges = np.concatenate((edges,
+                            connecting_edges(n_nodes, edges, rng, colours, k)))
+    graph = CSRGraph.from_edges(n_nodes, unique_edges(edges))
+
+    n_edges = len(graph.indices) // 2
+    density = n_edges / max(1, n_nodes*(n_nodes - 1)//2)
+    instance = {'name': f'{family}_{n_nodes}',
+                'family': family,
+                'n_nodes': n_nodes,
+                'p': p if p is not None else density,
+                'indptr': graph.indptr,
+                'indices': graph.indices,
+                'coords': coords,
+                'solutions': {}}
+    if colours is not None:
+        _, colours = np.unique(colours, return_inverse=True)
+        instance['solutions']['planted'] = (colours.max() + 1, colours)
+    return instance
+
+
+SEED = 88784
+LARGE_CORPUS_FILE = './graphs/large_corpus.bin'
+# Average degree of the benchmark graphs.
+AVERAGE_DEGREE = 10
+SIZES = (10**3, 10**4, 10**5)
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(SEED)
+    if not os.path.exists(os.path.dirname(LARGE_CORPUS_FILE)):
+        os.makedirs(os.path.dirname(LARGE_CORPUS_FILE))
+
+    instances = []
+    for n_nodes in SIZES:
+        p = AVERAGE_DEGREE / (n_nodes - 1)
+        families = {
+            'gnp': {'p': p},
+            'geometric': {'radius': math.sqrt(AVERAGE_DEGREE/(math.pi*n_nodes))},
+            'planted': {'k': 4, 'p': p * 4/3},
+            'power_law': {'average_degree': AVERAGE_DEGREE}}
+        for family, params in families.items():
+            t_start = time.perf_counter()
+            instance = generate_graph(family, n_nodes, rng, **params)
+            t_end = time.perf_counter()
+            n_edges = len(instance['indices']) // 2
+            print(f'Generated {family:<9} graph with {n_nodes:>6} nodes and ' +
+                  f'{n_edges:>6} edges in {t_end - t_start:.2f} s.')
+            instances.append(instance)
+
+    write_corpus(instances, LARGE_CORPUS_FILE)
+    print(f'\nWrote {len(instances)} graphs to {LARGE_CORPUS_FILE}.')
@@ -0,0 +1,126 @@
+"""Cache of the results of the chromatic number algorithms, so that graphs
+already solved are not solved again.
+Results are indexed by a hash of the labelled graph, so a graph is found
+in the cache no matter the file it was loaded from, but only with the same
+node labels: the hash is not canonical, and isomorphic graphs with their
+nodes numbered differently are different entries."""
+
+import hashlib
+import os
+import pickle
+
+
+CACHE_FILE = './results/results_cache.pkl'
+
+
+def labelled_graph_hash(adj_list):
+    """Returns a hash of the labelled graph (its number of nodes and its
+    edges between the node labels). It does not depend on the order of the
+    nodes in the adjacency list nor on the order of the neighbours in the
+    lists of neighbours of each node, but it does depend on the labels, so
+    relabelling the nodes gives another hash. The colourings cached are
+    indexed by these labels."""
+
+    edges = sorted({(min(node, neighbour), max(node, neighbour))
+                    for node in adj_list for neighbour in adj_list[node]})
+    graph_str = f'{len(adj_list)}:{edges}'
+    return hashlib.sha256(graph_str.encode('utf-8')).hexdigest()
+
+
+def remove_node(adj_list, removed):
+    """Returns the adjacency list of the graph without the node removed,
+    with the nodes after it renumbered to keep the nodes 0..n_nodes-2."""
+
+    def new_label(node):
+        return node - 1 if node > removed else node
+
+    return {new_label(node): [new_label(neighbour)
+                              for neighbour in adj_list[node]
+                              if neighbour != removed]
+            for node in adj_list if node != removed}
+
+
+class ResultCache:
+    """
+    Results of the algorithms (chromatic number, colouring and empirical
+    complexity data) for each graph, stored in a pickle file.
+
+    Results of the exhaustive search algorithms are exact, so they can also
+    bound the chromatic number of a graph from the graphs with one node
+    less, when these were solved before with the same labels (for example
+    for graphs grown by adding nodes). The random graphs of the corpus are
+    independent of each other, so for them no such bounds are found.
+    """
+
+    def __init__(self, file=CACHE_FILE):
+        """
+        Parameters
+        ----------
+        file : the pickle file where the cache is stored
+        """
+        self.file = file
+        if os.path.exists(file):
+            with open(file, 'rb') as f:
+                self.results = pickle.load(f)
+        else:
+            # graph hash -> {algorithm name: result}
+            self.results = {}
+
+    def get(self, adj_list, func_name):
+        """Returns the result of func_name for the graph as a dict,
+        or None if it is not in the cache."""
+        return self.results.get(labelled_graph_hash(adj_list),
+                                {}).get(func_name)
+
+    def put(self, adj_list, func_name, chromatic_number, colours, analysis):
+        """Stores the result of func_name for the graph."""
+        hash_ = labelled_graph_hash(adj_list)
+        self.results.setdefault(hash_, {})[func_name] = {
+            'chromatic_number': chromatic_number,
+            'colours': colours,
+            'analysis': analysis}
+
+    def exact_result(self, adj_list):
+        """Returns a result of an exact algorithm for the graph,
+        or None if there is none in the cache."""
+        for func_name, result in self.results.get(
+                labelled_graph_hash(adj_list), {}).items():
+            if func_name.startswith('chromatic_number_exhaustive'):
+                return result
+        return None
+
+    def bounds(self, adj_list):
+        """Returns a lower bound for the chromatic number of the graph and a
+        valid colouring of the graph (or None), using the exact results of
+        the graphs with one node less.
+        Removing a node decreases the chromatic number by at most one, and
+        the node can be added back to a colouring of the smaller graph by
+        giving it the smallest colour not used by its neighbours.
+        The smaller graphs are looked up with the nodes after the one
+        removed renumbered (see remove_node), so only graphs solved with
+        exactly these labels are found. Without any, the lower bound is 0
+        and the colouring None, which bound nothing."""
+
+        lower_bound = 0
+        best_colours = None
+        for removed in adj_list:
+            result = self.exact_result(remove_node(adj_list, removed))
+            if result is None:
+                continue
+            lower_bound = max(lower_bound, result['chromatic_number'])
+
+            colours = list(result['colours'])
+            neighbour_colours = {colours[neighbour - (neighbour > removed)]
+                                 for neighbour in adj_list[removed]}
+            colour = min(set(range(len(adj_list))) - neighbour_colours)
+            colours.insert(removed, colour)
+            if (best_colours is None
+                    or len(set(colours)) < len(set(best_colours))):
+                best_colours = colours
+
+        return lower_bound, best_colours
+
+    def save(self):
+        """Writes the cache to its file."""
+        with open(self.file, 'wb') as f:
+            pickle.dump(self.results, f)
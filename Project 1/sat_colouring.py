@@ -0,0 +1,509 @@
+"""Exact chromatic number from a k-colourability oracle: a small CDCL
+(conflict-driven clause learning) SAT solver deciding whether the graph
+can be coloured with k colours, for the values of k between a clique and
+the greedy heuristic.
+
+The same SAT instance answers every k, with the colours k.. switched off
+by assumptions, so the clauses learned while answering one k are kept for
+the next ones. The values of k are either bisected by a single oracle or
+searched upwards and downwards at the same time by two processes.
+
+Running this file solves the graphs in the corpus and checks the results
+against the exhaustive search solutions stored in the corpus."""
+
+import heapq
+from multiprocessing.connection import wait
+import multiprocessing
+import time
+
+from graph_corpus import GraphCorpus
+from greedy_heuristic import chromatic_number_greedy, greedy_clique
+from instrumentation import instrumented
+
+
+########## CDCL SAT SOLVER #############
+
+# A literal is 2*var for "var is true" and 2*var + 1 for "var is false",
+# so the negation of a literal is literal ^ 1.
+
+def luby(i):
+    """Returns the i-th term (from 0) of the Luby sequence
+    1, 1, 2, 1, 1, 2, 4, 1, 1, 2, ..., used as the restart intervals."""
+    size, power = 1, 0
+    while size < i + 1:
+        power += 1
+        size = 2*size + 1
+    while size - 1 != i:
+        size = (size - 1) // 2
+        power -= 1
+        i %= size
+    return 2 ** power
+
+
+class SATSolver:
+    """
+    CDCL SAT solver for clauses given as lists of literals, with two
+    watched literals per clause, first-UIP clause learning, VSIDS decision
+    heuristic, phase saving and Luby restarts.
+
+    solve() can be called several times with different assumptions (
+    literals taken as the first decisions) and more clauses added in
+    between. Learned clauses only depend on the clauses, not on the
+    assumptions, so they are all kept for the next calls.
+    """
+
+    RESTART_BASE = 100
+    VAR_DECAY = 0.95
+
+    def __init__(self):
+        self.clauses = []
+        self.watches = []       # literal -> clauses watching it
+        self.value = []         # variable -> 1, 0 or -1 (unassigned)
+        self.level = []         # variable -> decision level
+        self.reason = []        # variable -> clause implying it or None
+        self.activity = []
+        self.phase = []         # variable -> last value (phase saving)
+        self.seen = []
+        self.trail = []
+        self.trail_lim = []     # trail position of each decision level
+        self.queue_head = 0
+        self.heap = []          # (-activity, variable), outdated ones skipped
+        self.var_inc = 1.0
+        self.ok = True          # False if the clauses are unsatisfiable
+        self.model = None
+        self.n_decisions = 0
+        self.n_conflicts = 0
+        self.n_propagations = 0
+        self.n_learned = 0
+
+    def new_var(self, activity=0.0, phase=True):
+        """Adds a variable and returns its number. Variables with higher
+        initial activity are decided first, with the value phase."""
+        var = len(self.value)
+        self.value.append(-1)
+        self.level.append(0)
+        self.reason.append(None)
+        self.activity.append(float(activity))
+        self.phase.append(phase)
+        self.seen.append(False)
+        self.watches += [[], []]
+        heapq.heappush(self.heap, (-self.activity[var], var))
+        return var
+
+    def lit_value(self, lit):
+        """Returns 1 if lit is true, 0 if it is false and -1 if it is not
+        assigned."""
+        value = self.value[lit >> 1]
+        return value if value < 0 else value ^ (lit & 1)
+
+    def add_clause(self, lits):
+        """Adds a clause. Must be called between searches. Returns False if
+        the clauses became unsatisfiable."""
+        if not self.ok:
+            return False
+        clause = []
+        for lit in set(lits):
+            value = self.lit_value(lit)
+            if value == 1 or lit ^ 1 in lits:
+                return True
+            if value == -1:
+                clause.append(lit)
+
+        if not clause:
+            self.ok = False
+        elif len(clause) == 1:
+            self.enqueue(clause[0], None)
+            self.ok = self.propagate() is None
+        else:
+            self.clauses.append(clause)
+            self.watches[clause[0]].append(len(self.clauses) - 1)
+            self.watches[clause[1]].append(len(self.clauses) - 1)
+        return self.ok
+
+    def enqueue(self, lit, reason):
+        var = lit >> 1
+        self.value[var] = 1 ^ (lit & 1)
+        self.level[var] = len(self.trail_lim)
+        self.reason[var] = reason
+        self.trail.append(lit)
+
+    def propagate(self):
+        """Unit propagation of the literals in the trail not propagated yet.
+        Returns the clause in conflict, or None."""
+        # The two watched literals of a clause are its first two. A clause
+        # only needs to be looked at when one of them becomes false: then
+        # another literal not false takes its place, or the other watched
+        # literal is implied (or the clause is in conflict).
+
+        clauses = self.clauses
+        watches = self.watches
+        value = self.value
+        while self.queue_head < len(self.trail):
+            false_lit = self.trail[self.queue_head] ^ 1
+            self.queue_head += 1
+            self.n_propagations += 1
+            watchers = watches[false_lit]
+            watches[false_lit] = kept = []
+            for i, c in enumerate(watchers):
+                clause = clauses[c]
+                if clause[0] == false_lit:
+                    clause[0], clause[1] = clause[1], false_lit
+                first = clause[0]
+                first_value = value[first >> 1]
+                if first_value >= 0 and first_value ^ (first & 1):
+                    kept.append(c)
+                    continue
+                for j in range(2, len(clause)):
+                    lit = clause[j]
+                    lit_value = value[lit >> 1]
+                    if lit_value < 0 or lit_value ^ (lit & 1):
+                        clause[1], clause[j] = lit, false_lit
+                        watches[lit].append(c)
+                        break
+                else:
+                    kept.append(c)
+                    if first_value >= 0:
+                        kept += watchers[i + 1:]
+                        return c
+                    self.enqueue(first, c)
+        return None
+
+    def bump(self, var):
+        self.activity[var] += self.var_inc
+        if self.activity[var] > 1e100:
+            self.activity = [activity * 1e-100 for activity in self.activity]
+            self.var_inc *= 1e-100
+            self.heap = [(-activity, var) for var, activity
+                         in enumerate(self.activity)]
+            heapq.heapify(self.heap)
+        elif self.value[var] < 0:
+            heapq.heappush(self.heap, (-self.activity[var], var))
+
+    def analyse(self, conflict):
+        """Returns the first-UIP clause learned from the conflict, with the
+        asserting literal first and a literal of the largest other level
+        second, and the level to go back to."""
+
+        learned = [None]
+        n_current = 0      # literals of the current level left to resolve
+        current_level = len(self.trail_lim)
+        index = len(self.trail) - 1
+        clause = self.clauses[conflict]
+        start = 0          # the first literal of a reason is the implied one
+        while True:
+            for lit in clause[start:]:
+                var = lit >> 1
+                if not self.seen[var] and self.level[var] > 0:
+                    self.seen[var] = True
+                    self.bump(var)
+                    if self.level[var] == current_level:
+                        n_current += 1
+                    else:
+                        learned.append(lit)
+            while not self.seen[self.trail[index] >> 1]:
+                index -= 1
+            lit = self.trail[index]
+            index -= 1
+            self.seen[lit >> 1] = False
+            n_current -= 1
+            if n_current == 0:
+                break
+            clause = self.clauses[self.reason[lit >> 1]]
+            start = 1
+
+        learned[0] = lit ^ 1
+        for lit in learned[1:]:
+            self.seen[lit >> 1] = False
+        back_level = 0
+        if len(learned) > 1:
+            i = max(range(1, len(learned)),
+                    key=lambda i: self.level[learned[i] >> 1])
+            learned[1], learned[i] = learned[i], learned[1]
+            back_level = self.level[learned[1] >> 1]
+        self.var_inc /= self.VAR_DECAY
+        return learned, back_level
+
+    def cancel_until(self, level):
+        """Undoes the assignments of the decision levels above level."""
+        if len(self.trail_lim) <= level:
+            return
+        for lit in self.trail[self.trail_lim[level]:]:
+            var = lit >> 1
+            self.phase[var] = bool(self.value[var])
+            self.value[var] = -1
+            self.reason[var] = None
+            heapq.heappush(self.heap, (-self.activity[var], var))
+        del self.trail[self.trail_lim[level]:]
+        del self.trail_lim[level:]
+        self.queue_head = len(self.trail)
+
+    def pick_branch_var(self):
+        """Returns the unassigned variable with the highest activity, or
+        None if all are assigned."""
+        while self.heap:
+            activity, var = heapq.heappop(self.heap)
+            if self.value[var] < 0 and -activity == self.activity[var]:
+                return var
+        return None
+
+    def solve(self, assumptions=()):
+        """Returns True if the clauses are satisfiable with the assumed
+        literals true, and then the value of every variable is in model."""
+
+        self.model = None
+        if not self.ok:
+            return False
+        n_restarts = 0
+        conflicts_left = self.RESTART_BASE * luby(n_restarts)
+
+        while True:
+            conflict = self.propagate()
+            if conflict is not None:
+                self.n_conflicts += 1
+                conflicts_left -= 1
+                if not self.trail_lim:
+                    self.ok = False
+                    return False
+                learned, back_level = self.analyse(conflict)
+                self.cancel_until(back_level)
+                if len(learned) == 1:
+                    self.enqueue(learned[0], None)
+                else:
+                    self.clauses.append(learned)
+                    self.watches[learned[0]].append(len(self.clauses) - 1)
+                    self.watches[learned[1]].append(len(self.clauses) - 1)
+                    self.enqueue(learned[0], len(self.clauses) - 1)
+                self.n_learned += 1
+                continue
+
+            if conflicts_left <= 0:
+                n_restarts += 1
+                conflicts_left = self.RESTART_BASE * luby(n_restarts)
+                self.cancel_until(0)
+                continue
+
+            level = len(self.trail_lim)
+            if level < len(assumptions):
+                lit = assumptions[level]
+                value = self.lit_value(lit)
+                if value == 0:
+                    # The clauses imply the negation of an assumption.
+                    self.cancel_until(0)
+                    return False
+                self.trail_lim.append(len(self.trail))
+                if value < 0:
+                    self.enqueue(lit, None)
+                continue
+
+            var = self.pick_branch_var()
+            if var is None:
+                self.model = [value == 1 for value in self.value]
+                self.cancel_until(0)
+                return True
+            self.n_decisions += 1
+            self.trail_lim.append(len(self.trail))
+            self.enqueue(2*var + (not self.phase[var]), None)
+
+    def statistics(self):
+        """Returns the counts of the search so far."""
+        return {'n_decisions': self.n_decisions,
+                'n_conflicts': self.n_conflicts,
+                'n_propagations': self.n_propagations,
+                'n_learned': self.n_learned}
+
+
+########## K-COLOURABILITY ORACLE #############
+
+class ColouringOracle:
+    """
+    Answers whether a graph can be coloured with k colours, for any k up to
+    max_colours, keeping what was learned between the questions.
+
+    Variable x[node][c] tells that node has colour c and variable off[c]
+    that colour c is not used. The clauses say that every node has a colour,
+    adjacent nodes do not have the same colour and colours switched off are
+    not used. Asking for k colours assumes off[c] for c >= k and not off[c]
+    for c < k.
+    """
+
+    def __init__(self, adj_list, max_colours, clique=()):
+        """
+        Parameters
+        ----------
+        adj_list : adjacency list of the graph, with nodes 0..n-1
+        max_colours : largest number of colours that will be asked for
+        clique : nodes of a clique, given the colours 0, 1, ... to avoid
+            searching colourings that are renamings of each other
+        """
+        self.n_nodes = len(adj_list)
+        self.max_colours = max_colours
+        solver = self.solver = SATSolver()
+
+        # Nodes with more neighbours are decided first, like in DSATUR.
+        self.x = [[solver.new_var(activity=len(adj_list[node]) / self.n_nodes)
+                   for _ in range(max_colours)]
+                  for node in range(self.n_nodes)]
+        self.off = [solver.new_var(phase=False) for _ in range(max_colours)]
+
+        for node in range(self.n_nodes):
+            solver.add_clause([2*var for var in self.x[node]])
+            for colour in range(max_colours):
+                solver.add_clause([2*self.off[colour] + 1,
+                                   2*self.x[node][colour] + 1])
+            for neighbour in adj_list[node]:
+                if node < neighbour:
+                    for colour in range(max_colours):
+                        solver.add_clause([2*self.x[node][colour] + 1,
+                                           2*self.x[neighbour][colour] + 1])
+        for colour, node in enumerate(clique[:max_colours]):
+            solver.add_clause([2*self.x[node][colour]])
+
+    def colourable(self, k):
+        """Returns a list with the colour of each node in a colouring with
+        at most k colours, or None if there is none."""
+        assumptions = [2*self.off[colour] + (colour < k)
+                       for colour in range(self.max_colours)]
+        if not self.solver.solve(assumptions):
+            return None
+        model = self.solver.model
+        return [next(colour for colour in range(k) if model[self.x[node][colour]])
+                for node in range(self.n_nodes)]
+
+
+########## SAT SEARCH #############
+
+def _search_worker(adj_list, max_colours, clique, ascending, lower, upper,
+                   conn):
+    """Asks an oracle for increasing numbers of colours from lower until the
+    answer is yes (ascending) or for decreasing numbers of colours from
+    upper-1 until the answer is no, skipping the numbers of colours already
+    decided by the other worker (lower and upper are shared values updated
+    by the main process). Sends each answer through the connection conn,
+    with the statistics of the solver."""
+
+    oracle = ColouringOracle(adj_list, max_colours, clique)
+    k = lower.value if ascending else upper.value - 1
+    while True:
+        k = max(k, lower.value) if ascending else min(k, upper.value - 1)
+        if not lower.value <= k < upper.value:
+            break
+        colours = oracle.colourable(k)
+        conn.send((k, colours, oracle.solver.statistics()))
+        if ascending:
+            if colours is not None:
+                break
+            k += 1
+        else:
+            if colours is None:
+                break
+            k = len(set(colours)) - 1
+    conn.close()
+
+
+@instrumented('n_queries', 'n_decisions', 'n_conflicts', 'n_propagations',
+              'n_learned')
+def chromatic_number_sat(adj_list, parallel=False, *, counters=None):
+    """Returns the chromatic number of a given undirected graph
+    represented by its adjacency list and one possible colour combination
+    to obtain it, found with a k-colourability SAT oracle. The numbers of
+    colours are bisected, or searched upwards and downwards at the same
+    time by two processes if parallel is True."""
+    # The chromatic number is between the size of a clique (lower) and the
+    # colours of the greedy heuristic (upper). A yes answer for k gives a
+    # colouring, which may use less than k colours, and lowers upper to
+    # its colours; a no answer raises lower to k + 1.
+
+    n_nodes = len(adj_list)
+    with counters.phase('bounds'):
+        upper, greedy_colours = chromatic_number_greedy(adj_list)
+        best_colours = [greedy_colours[node] for node in range(n_nodes)]
+        clique = greedy_clique(adj_list)
+        lower = len(clique)
+    if lower == upper:
+        return upper, best_colours
+
+    if parallel:
+        with counters.phase('search'):
+            shared_lower = multiprocessing.Value('i', lower, lock=False)
+            shared_upper = multiprocessing.Value('i', upper, lock=False)
+            workers = {}  # connection -> process
+            for ascending in (True, False):
+                recv_conn, send_conn = multiprocessing.Pipe(duplex=False)
+                process = multiprocessing.Process(
+                    target=_search_worker,
+                    args=(adj_list, upper - 1, clique, ascending, shared_lower,
+                          shared_upper, send_conn))
+                process.start()
+                send_conn.close()
+                workers[recv_conn] = process
+
+            statistics = {}
+            while workers and shared_lower.value < shared_upper.value:
+                for conn in wait(list(workers)):
+                    try:
+                        k, colours, statistics[conn] = conn.recv()
+                    except EOFError:
+                        workers.pop(conn).join()
+                        continue
+                    counters.n_queries += 1
+                    if colours is None:
+                        shared_lower.value = max(shared_lower.value, k + 1)
+                    elif len(set(colours)) < shared_upper.value:
+                        shared_upper.value = len(set(colours))
+                        best_colours = colours
+
+            for process in workers.values():
+                process.terminate()
+                process.join()
+        for worker_statistics in statistics.values():
+            for name, count in worker_statistics.items():
+                setattr(counters, name, getattr(counters, name) + count)
+        lower, upper = shared_lower.value, shared_upper.value
+
+    # Without parallel, or if both workers stopped (died) before the bounds
+    # met, the numbers of colours left are bisected in this process.
+    if lower < upper:
+        with counters.phase('search'):
+            oracle = ColouringOracle(adj_list, upper - 1, clique)
+            while lower < upper:
+                k = (lower + upper) // 2
+                counters.n_queries += 1
+                colours = oracle.colourable(k)
+                if colours is None:
+                    lower = k + 1
+                else:
+                    best_colours = colours
+                    upper = len(set(colours))
+        for name, count in oracle.solver.statistics().items():
+            setattr(counters, name, getattr(counters, name) + count)
+
+    return upper, best_colours
+
+
+########## SAT SEARCH TESTING #############
+
+MAX_NODES = 20
+# Exact solutions in the corpus to check the results against.
+EXACT_SOLVERS = ('exhaustive_v3', 'exhaustive_v5', 'exhaustive_v1')
+
+
+if __name__ == '__main__':
+    corpus = GraphCorpus()
+    print(f'{"graph":>12} {"colours":>8} {"bisect (ms)":>12} ' +
+          f'{"parallel (ms)":>14}')
+    for k in corpus.instances(MAX_NODES):
+        adj_list = corpus.adj_list(k)
+        times = []
+        for parallel in (False, True):
+            t_start = time.perf_counter()
+            chromatic_number, colours = chromatic_number_sat(adj_list, parallel)
+            times.append(time.perf_counter() - t_start)
+            assert all(colours[node] != colours[neighbour]
+                       for node in adj_list for neighbour in adj_list[node])
+
+        exact = next((corpus.solution(k, solver) for solver in EXACT_SOLVERS
+                      if corpus.solution(k, solver)), None)
+        if exact is not None:
+            assert chromatic_number == exact[0]
+        print(f'{corpus.name(k):>12} {chromatic_number:>8} ' +
+              f'{1000*times[0]:>12.3f} {1000*times[1]:>14.3f}')
@@ -1,55 +1,422 @@
 """Counter functions: deterministic, with fixed probability and
-with decreasing probability."""
+with decreasing probability.
 
+The files are read in chunks of CHUNK_SIZE letters, adding up the number
+of occurrences of each letter in every chunk, so the memory used does not
+depend on the size of the file. The trials of the approximate counters are
+then drawn from these numbers of occurrences, which gives them the same
+distribution as counting the chunks one by one. count_all runs the three
+counters in a single pass over the chunks.
+
+All the counters also count letter n-grams (sequences of n consecutive
+letters) instead of single letters when given n > 1. The n-gram of the
+letters with codes c_1..c_n has the code c_1*26^(n-1) + ... + c_n. The
+counters return the codes of the n-grams that occur, and an array with
+their counts in the same order, so most of the 26^n n-grams (which do not
+occur in any text) take no memory."""
+
+from itertools import product
 from math import sqrt
-import random
+
+import numpy as np
 
 
 ord_A = ord('A')
 ord_Z = ord('Z')
+LETTERS = [chr(i) for i in range(ord_A, ord_Z+1)]
+
+CHUNK_SIZE = 1 << 20
+
+
+def letter_chunks(file, chunk_size=CHUNK_SIZE):
+    """Yields the letters of a file with only block capitals, chunk_size
+    letters at a time, as arrays with the code of each letter (0 for A to
+    25 for Z)."""
+    with open(file, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            yield np.frombuffer(chunk, dtype=np.uint8) - ord_A
+
+
+def ngram_names(n=1, codes=None):
+    """Returns the n-grams of letters with the given codes, or all of them
+    in the order of their codes."""
+    if codes is None:
+        return [''.join(ngram) for ngram in product(LETTERS, repeat=n)]
+    powers = len(LETTERS)**np.arange(n - 1, -1, -1)
+    digits = np.asarray(codes)[:, np.newaxis] // powers % len(LETTERS)
+    return [''.join(LETTERS[digit] for digit in ngram)
+            for ngram in digits.tolist()]
+
+
+def ngram_codes(codes, n=1):
+    """Returns the codes of the n-grams of an array of letter codes, one
+    for every position where an n-gram starts."""
+    n_ngrams = max(0, len(codes) - n + 1)
+    ngrams = codes[:n_ngrams].astype(np.int32)
+    for i in range(1, n):
+        ngrams = ngrams*len(LETTERS) + codes[i:n_ngrams + i]
+    return ngrams
+
+
+def ngram_chunks(chunks, n=1):
+    """Yields the codes of the n-grams of chunks of letter codes (like the
+    ones of letter_chunks), including the n-grams crossing from one chunk to
+    the next."""
+    if n == 1:
+        yield from chunks
+        return
+    # The last n-1 letters of a chunk start the n-grams ending in the next.
+    tail = np.empty(0, dtype=np.uint8)
+    for codes in chunks:
+        codes = np.concatenate((tail, codes))
+        yield ngram_codes(codes, n)
+        tail = codes[max(0, len(codes) - n + 1):]
+
+
+def occurrences(codes, n=1):
+    """Returns the number of occurrences of each n-gram in an array of
+    n-gram codes."""
+    return np.bincount(codes, minlength=len(LETTERS)**n)
+
+
+def ngram_occurrences(chunks, n=1):
+    """Returns the codes of the n-grams occurring in chunks of letter codes
+    (like the ones of letter_chunks), or of all the letters if n is 1, and
+    their numbers of occurrences."""
+    counts = np.zeros(len(LETTERS)**n, dtype=np.int64)
+    for codes in ngram_chunks(chunks, n):
+        counts += occurrences(codes, n)
+    codes = np.arange(len(LETTERS)) if n == 1 else np.flatnonzero(counts)
+    return codes, counts[codes]
+
+
+def fix_prob_increments(counts, occurrences, prob, rng):
+    """Updates the fixed probability counters counts, an array of shape
+    (n-grams, trials), with the given number of new occurrences of each
+    n-gram."""
+    # Each occurrence of a letter is counted with probability prob
+    # independently of all the others, so in every trial the count of a
+    # letter occurring n times follows a Binomial(n, prob) distribution. It
+    # is drawn directly for all the letters and trials at once, instead of
+    # drawing one random number per occurrence.
+    counts += rng.binomial(occurrences[:, np.newaxis], prob, size=counts.shape)
+
+
+def geometric_increments(counts, occurrences, denominator, rng,
+                         max_count=None):
+    """Updates the decreasing probability counters counts, a contiguous
+    array, with the given number of new occurrences of each counter (an
+    array broadcast to the shape of counts). Counters reaching max_count (if
+    given) are not incremented any more."""
+    # A counter with value k is incremented with probability 1/denominator^k,
+    # so the number of occurrences until its next increment follows a
+    # geometric distribution with that parameter. Instead of drawing one
+    # random number per occurrence, the waiting times are drawn for all the
+    # counters at once, and a counter stops when its wait goes beyond its
+    # occurrences left. Each counter takes about log(occurrences) steps, one
+    # per increment. The geometric distribution has no memory, so a wait cut
+    # at the end of a chunk is the same as a new wait drawn for the next one.
+    remaining = np.broadcast_to(occurrences, counts.shape).astype(np.int64)
+    remaining = remaining.reshape(-1)
+    counts = counts.reshape(-1)
+
+    # Counters that may still be incremented.
+    active = np.flatnonzero(remaining)
+    while active.size:
+        if max_count is not None:
+            active = active[counts[active] < max_count]
+        waits = rng.geometric(1 / denominator**counts[active].astype(np.float64))
+        incremented = waits <= remaining[active]
+        active = active[incremented]
+        remaining[active] -= waits[incremented]
+        counts[active] += 1
+
+
+def dec_prob_increments(counts, occurrences, denominator, rng):
+    """Updates the decreasing probability counters counts, an array of
+    shape (n-grams, trials), with the given number of new occurrences of
+    each n-gram."""
+    geometric_increments(counts, occurrences[:, np.newaxis], denominator, rng)
+
+
+def fix_prob_trials(occurrences, prob=1/16, n_counts=1_000, rng=None):
+    """Returns the counts of n_counts trials of the fixed probability
+    counter of things with the given numbers of occurrences, as an array
+    with one row per thing and one column per trial."""
+    rng = np.random.default_rng() if rng is None else rng
+    counts = np.zeros((len(occurrences), n_counts), dtype=np.int64)
+    fix_prob_increments(counts, occurrences, prob, rng)
+    return counts
+
+
+def dec_prob_trials(occurrences, denominator=sqrt(3), n_counts=1_000,
+                    rng=None):
+    """Returns the counts of n_counts trials of the decreasing probability
+    counter of things with the given numbers of occurrences, as an array
+    with one row per thing and one column per trial."""
+    rng = np.random.default_rng() if rng is None else rng
+    counts = np.zeros((len(occurrences), n_counts), dtype=np.int64)
+    dec_prob_increments(counts, occurrences, denominator, rng)
+    return counts
+
+
+def count_all(chunks, prob=1/16, denominator=sqrt(3), n_counts=1_000,
+              rng=None, n=1):
+    """Runs the deterministic, fixed probability and decreasing probability
+    counters of n-grams in one pass over chunks of letter codes (like the
+    ones of letter_chunks). Returns the codes of the n-grams that occur and
+    the results of the three counters for them."""
+
+    rng = np.random.default_rng() if rng is None else rng
+    codes, det_counts = ngram_occurrences(chunks, n)
+    return (codes, det_counts,
+            fix_prob_trials(det_counts, prob, n_counts, rng),
+            dec_prob_trials(det_counts, denominator, n_counts, rng))
+
+
+def det_count(file, n=1):
+    """Deterministic counter. Returns the codes of the n-grams that occur
+    and their counts."""
+    return ngram_occurrences(letter_chunks(file), n)
+
+
+def fix_prob_count(file, prob=1/16, n_counts=1_000, rng=None, n=1):
+    """Fixed probability counter. Returns the codes of the n-grams that
+    occur and their counts in every trial."""
+    codes, occurrences = det_count(file, n)
+    return codes, fix_prob_trials(occurrences, prob, n_counts, rng)
+
+
+def dec_prob_count(file, denominator=sqrt(3), n_counts=1_000, rng=None, n=1):
+    """Decreasing probability counter. Returns the codes of the n-grams
+    that occur and their counts in every trial."""
+    codes, occurrences = det_count(file, n)
+    return codes, dec_prob_trials(occurrences, denominator, n_counts, rng)
+
+
+def approx_count(file, n=1, base=2, bits=4, rng=None):
+    """Decreasing probability counter of n-grams with the counters packed
+    in an ApproxCounterArray, which uses bits/8 bytes per n-gram. Returns
+    the array, indexed by n-gram code."""
+
+    counters = ApproxCounterArray(len(LETTERS)**n, base, bits, rng)
+    for codes in ngram_chunks(letter_chunks(file), n):
+        counts = occurrences(codes, n)
+        seen = np.flatnonzero(counts)
+        counters.increment(seen, counts[seen])
+
+    return counters
+
+
+########## ESTIMATES #############
+
+def fix_prob_estimates(counts, prob=1/16):
+    """Returns the estimates of the number of occurrences given by fixed
+    probability counters."""
+    return np.asarray(counts) / prob
+
+
+def dec_prob_estimates(counts, denominator=sqrt(3)):
+    """Returns the estimates of the number of occurrences given by
+    decreasing probability counters."""
+    # Each occurrence adds 1 to the expected value of (denominator^k - 1) /
+    # (denominator - 1), so it is an unbiased estimate.
+    return (denominator**np.asarray(counts, dtype=np.float64) - 1) \
+        / (denominator - 1)
+
+
+class RunningStats:
+    """Statistics of the estimates of the number of occurrences of every
+    letter given by a counter over many trials, updated with blocks of
+    trials as they finish, so they use the same memory for any number of
+    trials.
+    For every letter it keeps the mean and the variance of the estimates
+    (with Welford's algorithm, extended to blocks of trials), the minimum
+    and maximum estimates, the mean absolute error and, optionally, a
+    histogram of the estimates divided by the exact number of occurrences."""
+
+    def __init__(self, exact, bins=None, keys=None):
+        """
+        Parameters
+        ----------
+        exact : the exact number of occurrences of each letter or n-gram,
+                as an array
+        bins : the edges of the bins of the histogram of the estimates
+               divided by the exact counts, or None for no histogram (values
+               out of the bins are counted in the first or last bin)
+        keys : the letters or n-grams, in the order of exact (by default
+               all the letters)
+        """
+        self.keys = LETTERS if keys is None else list(keys)
+        self.exact = np.asarray(exact, dtype=np.float64)
+        self.n = 0
+        self.mean = np.zeros(len(self.exact))
+        self.m2 = np.zeros(len(self.exact))
+        self.min = np.full(len(self.exact), np.inf)
+        self.max = np.full(len(self.exact), -np.inf)
+        self.abs_error = np.zeros(len(self.exact))
+
+        self.bins = None if bins is None else np.asarray(bins, dtype=np.float64)
+        self.histogram = None
+        if bins is not None:
+            self.histogram = np.zeros((len(self.exact), len(self.bins) - 1),
+                                      dtype=np.int64)
+
+    def update(self, estimates):
+        """Adds a block of trials, given as an array of estimates with one row
+        per letter and one column per trial."""
+        estimates = np.asarray(estimates, dtype=np.float64)
+        n_block = estimates.shape[1]
+        if n_block == 0:
+            return
+
+        # Chan et al. combination of the mean and sum of squared deviations
+        # of the trials seen and of the block.
+        block_mean = estimates.mean(axis=1)
+        block_m2 = ((estimates - block_mean[:, np.newaxis])**2).sum(axis=1)
+        n = self.n + n_block
+        delta = block_mean - self.mean
+        self.mean += delta * n_block / n
+        self.m2 += block_m2 + delta**2 * self.n * n_block / n
+        self.n = n
+
+        self.min = np.minimum(self.min, estimates.min(axis=1))
+        self.max = np.maximum(self.max, estimates.max(axis=1))
+        self.abs_error += np.abs(estimates - self.exact[:, np.newaxis]).sum(axis=1)
+
+        if self.histogram is not None:
+            ratios = np.divide(estimates, self.exact[:, np.newaxis],
+                               out=np.ones_like(estimates),
+                               where=self.exact[:, np.newaxis] > 0)
+            bin_idxs = np.clip(np.searchsorted(self.bins, ratios, side='right') - 1,
+                               0, len(self.bins) - 2)
+            letter_idxs = np.repeat(np.arange(len(self.exact)), n_block)
+            np.add.at(self.histogram, (letter_idxs, bin_idxs.ravel()), 1)
+
+    def results(self):
+        """Returns a dict from the name of every statistic to the array with
+        its value for each letter (or n-gram), in the order of keys (the
+        histogram has one row per letter and one column per bin)."""
+        std = np.sqrt(self.m2 / self.n) if self.n else np.full_like(self.m2, np.nan)
+        mean_abs_error = self.abs_error / max(self.n, 1)
+        mean_rel_error = np.divide(mean_abs_error, self.exact,
+                                   out=np.zeros_like(mean_abs_error),
+                                   where=self.exact > 0)
+
+        results = {'exact': self.exact, 'mean': self.mean, 'std': std,
+                   'min': self.min, 'max': self.max,
+                   'mean_abs_error': mean_abs_error,
+                   'mean_rel_error': mean_rel_error}
+        if self.histogram is not None:
+            results['histogram'] = self.histogram
+        return results
 
-def det_count(file):
-    """Deterministic counter."""
 
-    results = {chr(i): 0 for i in range(ord_A, ord_Z+1)}
-    with open(file, 'r') as f:
-        contents = f.read()
-    for char in contents:
-        results[char] += 1
+########## APPROXIMATE COUNTER ARRAY #############
 
-    return results
+class ApproxCounterArray:
+    """An array of decreasing probability (Morris) counters, with each
+    counter packed in 4 or 8 bits, for counting very many things at once
+    (like the letters or n-grams of every document of a collection).
+    A counter only keeps the exponent k, incremented with probability
+    1/base^k on every occurrence, and estimates (base^k - 1)/(base - 1)
+    occurrences. With bits bits it saturates at k = 2^bits - 1, so base must
+    be chosen for the largest counts expected: for base 2 and 4 bits the
+    largest estimate is 32767."""
 
+    def __init__(self, size, base=2, bits=4, rng=None):
+        """
+        Parameters
+        ----------
+        size : the number of counters
+        base : the base of the counters, larger counts more occurrences with
+               the same bits, but with less precision
+        bits : the bits of each counter, 4 or 8
+        rng : the NumPy random generator used for the increments
+        """
+        if bits not in (4, 8):
+            raise ValueError(f'Counters of {bits} bits are not supported')
+        self.size = size
+        self.base = base
+        self.bits = bits
+        self.max_value = (1 << bits) - 1
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.data = np.zeros((size + 1) // 2 if bits == 4 else size,
+                             dtype=np.uint8)
 
-def fix_prob_count(file, prob=1/16, n_counts=1_000):
-    """Fixed probability counter."""
+    def __len__(self):
+        return self.size
 
-    results = {chr(i): [0]*n_counts for i in range(ord_A, ord_Z+1)}
-    with open(file, 'r') as f:
-        contents = f.read()
-    
-    for n_try in range(n_counts):
-        for char in contents:
-            if random.random() < prob:
-                results[char][n_try] += 1
+    @property
+    def nbytes(self):
+        """The memory used by the counters, in bytes."""
+        return self.data.nbytes
 
-    return results
+    def values(self, keys=None):
+        """Returns the exponents of the counters with the given keys (indices),
+        or of all the counters."""
+        keys = np.arange(self.size) if keys is None else np.asarray(keys)
+        if self.bits == 8:
+            return self.data[keys]
+        # Counter i is in the low half of byte i//2 if i is even, and in the
+        # high half if i is odd.
+        return (self.data[keys >> 1] >> ((keys & 1) << 2)) & 0xF
 
+    def _set_values(self, keys, values):
+        # keys must not be repeated. Two counters sharing a byte are set in
+        # different assignments, so one does not overwrite the other.
+        values = values.astype(np.uint8)
+        if self.bits == 8:
+            self.data[keys] = values
+            return
+        for half in (0, 1):
+            in_half = (keys & 1) == half
+            idxs = keys[in_half] >> 1
+            shift = half << 2
+            self.data[idxs] = ((self.data[idxs] & (0xF0 >> shift))
+                               | (values[in_half] << shift))
 
-def dec_prob_count(file, denominator=sqrt(3), n_counts=1_000):
-    """Decreasing probability counter."""
-    
-    dec_probs = [1/(denominator**k) for k in range(128)]
+    def increment(self, keys, occurrences=None):
+        """Counts one occurrence of every key in keys (an array of indices,
+        which may be repeated), or occurrences[i] occurrences of keys[i]."""
+        keys = np.asarray(keys)
+        if occurrences is None:
+            keys, occurrences = np.unique(keys, return_counts=True)
+        else:
+            keys, inverse = np.unique(keys, return_inverse=True)
+            occurrences = np.bincount(inverse, weights=occurrences,
+                                      minlength=len(keys)).astype(np.int64)
 
-    results = {chr(i): [0]*n_counts for i in range(ord_A, ord_Z+1)}
-    with open(file, 'r') as f:
-        contents = f.read()
-    
-    for n_try in range(n_counts):
-        for char in contents:
-            k = results[char][n_try]
-            if random.random() < dec_probs[k]:
-                results[char][n_try] += 1
+        values = self.values(keys).astype(np.int64)
+        geometric_increments(values, occurrences, self.base, self.rng,
+                             self.max_value)
+        self._set_values(keys, values)
 
-    return results
+    def estimate(self, keys=None):
+        """Returns the estimated number of occurrences of the given keys, or of
+        all the counters."""
+        return dec_prob_estimates(self.values(keys), self.base)
 
+    def merge(self, other):
+        """Adds the occurrences counted by other, an array of counters with the
+        same size, base and bits, to the counters of this array."""
+        # The j-th increment of a counter happened with probability 1/base^j,
+        # so it stands for base^j occurrences. Replaying it on a counter with
+        # value k as an increment with probability base^j/base^k adds
+        # base^j*(base - 1) to the expected value of base^k, so the expected
+        # estimate of the merged counter is the sum of both estimates. The
+        # larger of the two counters is kept and the smaller one replayed.
+        if (other.size, other.base, other.bits) != (self.size, self.base,
+                                                     self.bits):
+            raise ValueError('Only arrays with the same size, base and bits '
+                             'can be merged')
 
+        own = self.values().astype(np.int64)
+        others = other.values().astype(np.int64)
+        values = np.maximum(own, others)
+        replayed = np.minimum(own, others)
+        for j in range(int(replayed.max(initial=0))):
+            idxs = np.flatnonzero((replayed > j) & (values < self.max_value))
+            probs = float(self.base)**(j - values[idxs])
+            values[idxs] += self.rng.random(len(idxs)) < probs
+        self._set_values(np.arange(self.size), values)
@@ -1,66 +1,115 @@
-"""Preprocess the book in the different languages."""
+"""Preprocess the book in the different languages.
+
+The files are read and written in chunks of CHUNK_SIZE characters, so
+books of any size can be processed with bounded memory."""
 
 from glob import glob
 import re
+
+import numpy as np
 from unidecode import unidecode
 
 
 BOOK_PATH = './book'
+CHUNK_SIZE = 1 << 20
 
+# Strings marking the start and the end of the book, in each language.
+MARKERS = {
+    'pt': ('CAPITULO I', 'FIM DE «DA TERRA Á LUA».'),
+    'en': ('CHAPTER I.', '(FOR SEQUEL, SEE "AROUND THE MOON.")'),
+    'fr': ('''I
+                         --------------------''',
+           'End of the Project Gutenberg EBook'),
+}
+
+NOT_LETTER_OR_SPACE = re.compile(r'[^A-Z\s]')
+NOT_LETTER = re.compile(r'[^A-Z]')
 
-def trim_text(file):
-    """Removes the Project Gutenberg file headers, notes, 
-    and license information. In the case of the English text, also removes the 
-    sequel book that follows the book of interest."""
 
+def read_chunks(file, chunk_size=CHUNK_SIZE):
+    """Yields the contents of a text file, chunk_size characters at a
+    time."""
     with open(file, 'r') as f:
-        contents = f.read()
+        while chunk := f.read(chunk_size):
+            yield chunk
 
-    # Find the indices of the starting and ending strings.
-    lang = file.split('/')[-1][:2]
-    if lang == 'pt':
-        start_idx = contents.find('CAPITULO I')
-        end_idx = contents.find('FIM DE «DA TERRA Á LUA».')
-    elif lang == 'en':
-        start_idx = contents.find('CHAPTER I.')
-        end_idx = contents.find('(FOR SEQUEL, SEE "AROUND THE MOON.")')
-    elif lang == 'fr':
-        start_idx = contents.find('''I
-                         --------------------''')
-        end_idx = contents.find('End of the Project Gutenberg EBook')
-
-    contents = contents[start_idx:end_idx]
-    
-    # Write the trimmed content to a new file.
-    with open(f'{BOOK_PATH}/{lang}_trimmed.txt', 'w') as f:
-        f.write(contents)        
 
+def trim_text(file, chunk_size=CHUNK_SIZE):
+    """Removes the Project Gutenberg file headers, notes,
+    and license information. In the case of the English text, also removes the
+    sequel book that follows the book of interest."""
+    # A marker may be split between two chunks, so the last len(marker) - 1
+    # characters of a chunk are kept and searched again with the next one.
 
-def convert_letters(file):
+    lang = file.split('/')[-1][:2]
+    start, end = MARKERS[lang]
+
+    with open(f'{BOOK_PATH}/{lang}_trimmed.txt', 'w') as f:
+        buffer = ''
+        started = False
+        for chunk in read_chunks(file, chunk_size):
+            buffer += chunk
+            if not started:
+                start_idx = buffer.find(start)
+                if start_idx < 0:
+                    buffer = buffer[max(0, len(buffer) - len(start) + 1):]
+                    continue
+                started = True
+                buffer = buffer[start_idx:]
+
+            end_idx = buffer.find(end)
+            if end_idx >= 0:
+                buffer = buffer[:end_idx]
+                break
+            keep = max(0, len(buffer) - len(end) + 1)
+            f.write(buffer[:keep])
+            buffer = buffer[keep:]
+
+        if started:
+            f.write(buffer)
+
+
+def clean_chunks(file, chunk_size=CHUNK_SIZE):
+    """Yields the contents of a text file chunk by chunk, with all letters
+    converted to block capitals without accents and all non-alphabetic
+    characters other than whitespace removed."""
+    # Both unidecode and the filtering work one character at a time, so
+    # converting every chunk separately gives the same text as converting
+    # the whole file.
+    for chunk in read_chunks(file, chunk_size):
+        yield NOT_LETTER_OR_SPACE.sub('', unidecode(chunk).upper())
+
+
+def cleaned_letter_chunks(file, chunk_size=CHUNK_SIZE):
+    """Yields the letters of any text file, converted like in
+    convert_letters, chunk by chunk as arrays with the code of each letter
+    (0 for A to 25 for Z), without writing the converted text. They can be
+    given to counters.count_all, like the chunks of counters.letter_chunks,
+    which reads a file already converted."""
+    for chunk in clean_chunks(file, chunk_size):
+        letters = NOT_LETTER.sub('', chunk).encode('ascii')
+        yield np.frombuffer(letters, dtype=np.uint8) - ord('A')
+
+
+def convert_letters(file, chunk_size=CHUNK_SIZE):
     """Converts all letters to block capitals, while removing all
     non-alphabetic characters. Accented characters
     are transformed in the corresponding "regular" character."""
 
-    with open(file, 'r') as f:
-        contents = f.read()
-
-    contents = unidecode(contents).upper()
-    contents = re.sub(r'[^A-Z\s]', '', contents)
-
     lang = file.split('/')[-1][:2]
-    
-    # Write the cleaned up content (with spaces) to a new file.
-    with open(f'{BOOK_PATH}/{lang}_letters_readable.txt', 'w') as f:
-        f.write(contents)
 
-    contents = re.sub(r'[^A-Z]', '', contents)
-    # Write the cleaned up content (only letters) to a nee file.
-    with open(f'{BOOK_PATH}/{lang}_letters.txt', 'w') as f:
-        f.write(contents)
+    # Write the cleaned up content (with spaces) to a new file, and the
+    # cleaned up content (only letters) to another one.
+    with open(f'{BOOK_PATH}/{lang}_letters_readable.txt', 'w') as f_readable, \
+         open(f'{BOOK_PATH}/{lang}_letters.txt', 'w') as f_letters:
+        for chunk in clean_chunks(file, chunk_size):
+            f_readable.write(chunk)
+            f_letters.write(NOT_LETTER.sub('', chunk))
 
 
-for file in glob(f'{BOOK_PATH}/*_original.txt'):
-    trim_text(file)
+if __name__ == '__main__':
+    for file in glob(f'{BOOK_PATH}/*_original.txt'):
+        trim_text(file)
 
-for file in glob(f'{BOOK_PATH}/*_trimmed.txt'):
-    convert_letters(file)
\ No newline at end of file
+    for file in glob(f'{BOOK_PATH}/*_trimmed.txt'):
+        convert_letters(file)
@@ -2,58 +2,258 @@
 
 from counters import *
 
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from glob import glob
 import json
+from math import sqrt
+import os
+
+import numpy as np
+
+from preprocess_text import cleaned_letter_chunks
+from result_store import ResultStore
 
 
 BOOK_PATH = './book'
 RESULTS_PATH = './results'
 
+# Number of trials run with each random generator.
+TRIAL_BLOCK = 100
+
+
+def count_block(func, occurrences, n_counts, seed_seq, kwargs):
+    """Runs n_counts trials of the counter func for the given numbers of
+    occurrences, with a random generator seeded by seed_seq."""
+    rng = np.random.default_rng(seed_seq)
+    return func(occurrences, n_counts=n_counts, rng=rng, **kwargs)
+
+
+def book_counts(files, chunks=letter_chunks):
+    """Returns a dict from the language of each file to its letters and
+    their numbers of occurrences, reading every file once, in chunks given
+    by chunks (letter_chunks for the letter files, or cleaned_letter_chunks
+    for any text)."""
+    counts = {}
+    for file in sorted(files):
+        codes, occurrences = ngram_occurrences(chunks(file))
+        counts[file.split('/')[-1][:2]] = (ngram_names(1, codes), occurrences)
+    return counts
+
+
+def trial_blocks(func, counts, n_counts, seed=None, workers=1, **kwargs):
+    """Runs n_counts trials of the counter func (fix_prob_trials or
+    dec_prob_trials, with the parameters kwargs) for the letters of every
+    language, given by counts (see book_counts), in workers processes.
+    Yields the language and the counts of every block of trials, in order,
+    as they finish."""
+    # The trials of every language are split in blocks of TRIAL_BLOCK
+    # trials, each with its own random generator spawned from the seed. The
+    # blocks do not depend on the number of workers, so the same seed always
+    # gives the same results. At most 2*workers blocks are submitted at a
+    # time, and a new one only when the oldest is yielded, so the blocks
+    # waiting to be used take bounded memory.
+
+    root_seq = np.random.SeedSequence(seed)
+    if seed is None:
+        print(f'\tseed: {root_seq.entropy}')
+
+    n_blocks, last_block = divmod(n_counts, TRIAL_BLOCK)
+    sizes = [TRIAL_BLOCK]*n_blocks + ([last_block] if last_block else [])
+    langs = []
+    tasks = []
+    for lang, lang_seq in zip(sorted(counts), root_seq.spawn(len(counts))):
+        for size, block_seq in zip(sizes, lang_seq.spawn(len(sizes))):
+            langs.append(lang)
+            tasks.append((func, counts[lang][1], size, block_seq, kwargs))
+
+    if workers == 1:
+        yield from zip(langs, (count_block(*task) for task in tasks))
+    else:
+        with ProcessPoolExecutor(workers) as executor:
+            pending = deque()
+            for lang, task in zip(langs, tasks):
+                if len(pending) == 2*workers:
+                    done_lang, future = pending.popleft()
+                    yield done_lang, future.result()
+                pending.append((lang, executor.submit(count_block, *task)))
+            while pending:
+                done_lang, future = pending.popleft()
+                yield done_lang, future.result()
+
+
+def run_trials(func, counts, n_counts, seed=None, workers=1, **kwargs):
+    """Runs n_counts trials of the counter func for every language, like
+    trial_blocks. Returns a dict from each language to its letters (or
+    n-grams) and the array with their counts in every trial."""
+
+    blocks = {}
+    for lang, block in trial_blocks(func, counts, n_counts, seed, workers,
+                                    **kwargs):
+        blocks.setdefault(lang, []).append(block)
+    return {lang: (counts[lang][0], np.hstack(blocks[lang]))
+            for lang in sorted(blocks)}
+
+
+def aggregate_trials(func, estimates, counts, n_counts, seed=None, workers=1,
+                     bins=None, **kwargs):
+    """Runs n_counts trials of the counter func for every language, like
+    trial_blocks, without keeping the counts of every trial. estimates
+    is the function that turns the counts into estimates of the number of
+    occurrences (fix_prob_estimates or dec_prob_estimates, called with
+    the same parameters kwargs). Returns a dict from each language to its
+    letters (or n-grams) and the statistics of their estimates (see
+    RunningStats.results)."""
+
+    stats = {lang: RunningStats(occurrences, bins, keys)
+             for lang, (keys, occurrences) in counts.items()}
+    for lang, block in trial_blocks(func, counts, n_counts, seed, workers,
+                                    **kwargs):
+        stats[lang].update(estimates(block, **kwargs))
+    return {lang: (stats[lang].keys, stats[lang].results())
+            for lang in sorted(stats)}
+
+
+def store_results(method, results, params, store=None, seed=None):
+    """Saves the results of a counter, a dict from each language to the
+    letters (or n-grams) and the array with their counts or counts per
+    trial, in the result store. Counts per trial are added after the trials
+    already saved with the same parameters (which include the number of
+    trials per run, n_counts, so runs of different sizes are kept apart),
+    unless the trials of the same seed are already saved, and other counts
+    replace the ones saved."""
+    store = ResultStore() if store is None else store
+    for lang, (keys, values) in results.items():
+        if values.ndim == 2:
+            store.append(method, lang, params, keys, values, seed)
+        else:
+            store.put(method, lang, params, keys, values)
+
+
+def check_seed(method, langs, params, seed, store=None):
+    """Raises a ValueError if the trials of method with the given parameters
+    and seed are already saved for any of the languages langs, before they
+    are run again."""
+    store = ResultStore() if store is None else store
+    for lang in langs:
+        if seed is not None and seed in store.seeds(method, lang, params):
+            raise ValueError(f'The trials of {method} ({lang}, {params}) '
+                             f'with seed {seed} are already saved')
+
+
+def store_stats(method, results, params, store=None):
+    """Saves the statistics of the estimates of a counter (see
+    aggregate_trials) in the result store, each with its name as the
+    parameter stat, replacing the ones saved with the same parameters."""
+    store = ResultStore() if store is None else store
+    for lang, (keys, stats) in results.items():
+        for stat, values in stats.items():
+            store.put(method, lang, {**params, 'stat': stat}, keys, values)
+
+
+# Denominators of the runs of the decreasing probability counter saved as
+# JSON: only the last one, with 900 trials, did not use the default sqrt(3).
+JSON_DENOMINATORS = {900: 2}
+
+
+def convert_results(store=None):
+    """Appends the results saved as JSON by earlier versions of main to the
+    result store, with the number of trials of each file (its suffix
+    x<n_counts>) as a parameter."""
+    store = ResultStore() if store is None else store
+    def load(file):
+        with open(file) as f:
+            results = json.load(f)
+        return {lang: (list(lang_results),
+                       np.array(list(lang_results.values())))
+                for lang, lang_results in results.items()}
+
+    store_results('det_counter', load(f'{RESULTS_PATH}/det_counter.json'), {},
+                  store)
+    for method in ('fix_prob_counter', 'dec_prob_counter'):
+        for file in sorted(glob(f'{RESULTS_PATH}/{method}_x*.json')):
+            n_counts = int(file.split('_x')[-1][:-len('.json')])
+            if method == 'fix_prob_counter':
+                params = {'prob': 1/16, 'n_counts': n_counts}
+            else:
+                params = {'denominator': JSON_DENOMINATORS.get(n_counts,
+                                                               sqrt(3)),
+                          'n_counts': n_counts}
+            store_results(method, load(file), params, store)
+
+
+def main(funcs=(det_count, fix_prob_count, dec_prob_count), n_counts=1000,
+         seed=None, workers=1, aggregate=False, bins=None, clean=False):
+    """Runs the counters in funcs on the books. Every book is read once,
+    and the trials of the approximate counters are drawn from its numbers
+    of occurrences of each letter. With clean, the trimmed books are read
+    and converted as they are read (see cleaned_letter_chunks), instead of
+    the letter files written by preprocess_text. The trials of the same
+    seed are saved only once, so a run repeated with the seed it printed
+    (when seed is None) fails instead of saving the same trials again."""
+
+    # The seed is saved with the trials, so it is drawn here when not given.
+    if seed is None:
+        seed = np.random.SeedSequence().entropy
+        print(f'Seed: {seed}')
+
+    print('Reading the books...')
+    if clean:
+        counts = book_counts(glob(f'{BOOK_PATH}/*_trimmed.txt'),
+                             cleaned_letter_chunks)
+    else:
+        counts = book_counts(glob(f'{BOOK_PATH}/*_letters.txt'))
+    print('ALL DONE.')
 
-def main(funcs=(det_count, fix_prob_count, dec_prob_count), n_counts=1000):
-    
     if det_count in funcs:
-        print('Running the deterministic counter...')
-        det_results = {}
-        for file in glob(f'{BOOK_PATH}/*_letters.txt'):
-            lang = file.split('/')[-1][:2]
-            print(f'\tlanguage: {lang.upper()} ...', end='')
-            det_results[lang] = det_count(file)
-            print(' DONE')
-
-        print('ALL DONE.', end=' ')
-        with open(f'{RESULTS_PATH}/det_counter.json', 'w', ) as f:
-            json.dump(det_results, f, indent=4)
+        print('\nRunning the deterministic counter...')
+        store_results('det_counter', counts, {})
         print('RESULTS SAVED.')
 
     if fix_prob_count in funcs:
         print('\nRunning the fixed probability counter...')
-        fix_prob_results = {}
-        for file in glob(f'{BOOK_PATH}/*_letters.txt'):
-            lang = file.split('/')[-1][:2]
-            print(f'\tlanguage: {lang.upper()} ...', end='', flush=True)
-            fix_prob_results[lang] = fix_prob_count(file, prob=1/16, 
-                                                    n_counts=n_counts)
-            print(' DONE')
-        print('ALL DONE.', end=' ')
-        with open(f'{RESULTS_PATH}/fix_prob_counter_x{n_counts}.json', 'w', ) as f:
-            json.dump(fix_prob_results, f, indent=4)
+        if aggregate:
+            fix_prob_results = aggregate_trials(fix_prob_trials,
+                                                fix_prob_estimates, counts,
+                                                n_counts, seed, workers, bins,
+                                                prob=1/16)
+            print('ALL DONE.', end=' ')
+            store_stats('fix_prob_stats', fix_prob_results,
+                        {'prob': 1/16, 'n_counts': n_counts, 'seed': seed,
+                         'bins': None if bins is None
+                         else np.asarray(bins).tolist()})
+        else:
+            check_seed('fix_prob_counter', counts,
+                       {'prob': 1/16, 'n_counts': n_counts}, seed)
+            fix_prob_results = run_trials(fix_prob_trials, counts, n_counts,
+                                          seed, workers, prob=1/16)
+            print('ALL DONE.', end=' ')
+            store_results('fix_prob_counter', fix_prob_results,
+                          {'prob': 1/16, 'n_counts': n_counts}, seed=seed)
         print('RESULTS SAVED.')
 
     if dec_prob_count in funcs:
         print('\nRunning the decreasing probability counter...')
-        dec_prob_results = {}
-        for file in glob(f'{BOOK_PATH}/*_letters.txt'):
-            lang = file.split('/')[-1][:2]
-            print(f'\tlanguage: {lang.upper()} ...', end='', flush=True)
-            dec_prob_results[lang] = dec_prob_count(file, denominator=2, 
-                                                    n_counts=n_counts)
-            print(' DONE')
-        print('ALL DONE.', end=' ')
-        with open(f'{RESULTS_PATH}/dec_prob_counter_x{n_counts}.json', 'w', ) as f:
-            json.dump(dec_prob_results, f, indent=4)
+        if aggregate:
+            dec_prob_results = aggregate_trials(dec_prob_trials,
+                                                dec_prob_estimates, counts,
+                                                n_counts, seed, workers, bins,
+                                                denominator=2)
+            print('ALL DONE.', end=' ')
+            store_stats('dec_prob_stats', dec_prob_results,
+                        {'denominator': 2, 'n_counts': n_counts, 'seed': seed,
+                         'bins': None if bins is None
+                         else np.asarray(bins).tolist()})
+        else:
+            check_seed('dec_prob_counter', counts,
+                       {'denominator': 2, 'n_counts': n_counts}, seed)
+            dec_prob_results = run_trials(dec_prob_trials, counts, n_counts,
+                                          seed, workers, denominator=2)
+            print('ALL DONE.', end=' ')
+            store_results('dec_prob_counter', dec_prob_results,
+                          {'denominator': 2, 'n_counts': n_counts}, seed=seed)
         print('RESULTS SAVED.')
 
 
 if __name__ == '__main__':
-    main(funcs=(dec_prob_count, ), n_counts=900)
\ No newline at end of file
+    main(funcs=(dec_prob_count, ), n_counts=900, workers=os.cpu_count())
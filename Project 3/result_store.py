@@ -0,0 +1,182 @@
+"""Columnar store of the results of the counters, so the analysis can
+load only the results it needs.
+
+Every result is an array with one row per key (letter or word) and,
+optionally, one column per trial, identified by the counting method, the
+language and the parameters of the method. Each array is saved in its own
+.npy file, next to an array with its keys (encoded in UTF-8), and a small
+JSON index lists them all. Arrays are loaded memory-mapped, so only the
+parts read are brought into memory, and new runs are appended as new files
+without rewriting the ones already saved.
+
+Projects 2 and 3 each keep a copy of this module, like the rest of their
+code, so that every project runs on its own from its directory. The two
+copies are the same, and should be changed together."""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+STORE_PATH = './results/store'
+INDEX_FILE = 'index.json'
+
+
+def params_key(params):
+    """Returns a string identifying a dict of parameters, independent of
+    the order of its items."""
+    return json.dumps(params, sort_keys=True)
+
+
+class ResultStore:
+    """
+    Results of the counters for each method, language and set of
+    parameters, stored as .npy files in a directory.
+
+    Results appended more than once for the same method, language and
+    parameters (more trials of the same experiment) are kept as parts and
+    joined along the trial axis when loaded, while results put replace the
+    ones saved before.
+    """
+
+    def __init__(self, path=STORE_PATH):
+        """
+        Parameters
+        ----------
+        path : the directory where the store is kept
+        """
+        self.path = path
+        self.index_file = f'{path}/{INDEX_FILE}'
+        if os.path.exists(self.index_file):
+            with open(self.index_file) as f:
+                self.index = json.load(f)
+        else:
+            # One entry per method, language and parameters.
+            self.index = []
+
+    def _entry(self, method, lang, params):
+        for entry in self.index:
+            if (entry['method'] == method and entry['lang'] == lang
+                    and params_key(entry['params']) == params_key(params)):
+                return entry
+        return None
+
+    def _file_name(self, method, lang, params):
+        digest = hashlib.sha256(params_key(params).encode('utf-8')).hexdigest()
+        return f'{method}_{lang}_{digest[:12]}'
+
+    def append(self, method, lang, params, keys, values, seed=None):
+        """Saves the results values (an array with one row per key and one
+        column per trial) of method for the language lang with the given
+        parameters, after the trials already saved for them. seed is the
+        seed the trials were run with, if known: the trials of a seed
+        already appended would be the same ones again, so they are
+        rejected."""
+
+        values = np.asarray(values)
+        if values.ndim != 2:
+            raise ValueError(f'Only results with one column per trial can '
+                             f'be appended, not {values.ndim}-D ones')
+        entry = self._entry(method, lang, params)
+        if entry is not None and np.load(f'{self.path}/{entry["parts"][0]}',
+                                         mmap_mode='r').ndim != 2:
+            raise ValueError(f'The results of {method} ({lang}, {params}) '
+                             f'were put without trials, and cannot be '
+                             f'appended to')
+        if seed is not None and seed in self.seeds(method, lang, params):
+            raise ValueError(f'The trials of {method} ({lang}, {params}) '
+                             f'with seed {seed} are already saved')
+        self._add_part(method, lang, params, keys, values, seed)
+
+    def _add_part(self, method, lang, params, keys, values, seed=None):
+        keys = np.char.encode(np.asarray(keys, dtype=np.str_), 'utf-8')
+        values = np.asarray(values)
+        if len(values) != len(keys):
+            raise ValueError(f'{len(keys)} keys for {len(values)} rows')
+        os.makedirs(self.path, exist_ok=True)
+
+        entry = self._entry(method, lang, params)
+        if entry is None:
+            name = self._file_name(method, lang, params)
+            np.save(f'{self.path}/{name}_keys.npy', keys)
+            entry = {'method': method, 'lang': lang, 'params': params,
+                     'keys': f'{name}_keys.npy', 'parts': [], 'seeds': []}
+            self.index.append(entry)
+        elif not np.array_equal(np.load(f'{self.path}/{entry["keys"]}'), keys):
+            raise ValueError(f'The keys of {method} ({lang}, {params}) '
+                             f'do not match the ones already saved')
+
+        part = f'{entry["keys"][:-len("_keys.npy")]}_{len(entry["parts"])}.npy'
+        np.save(f'{self.path}/{part}', values)
+        entry['parts'].append(part)
+        # Stores saved before the seeds were kept have none for their parts.
+        entry.setdefault('seeds', [None] * (len(entry['parts']) - 1))
+        entry['seeds'].append(seed)
+        self.save()
+
+    def put(self, method, lang, params, keys, values):
+        """Saves the results values (an array with one row per key, of any
+        number of dimensions) of method for the language lang with the
+        given parameters, replacing the results already saved for them."""
+        entry = self._entry(method, lang, params)
+        if entry is not None:
+            for file in [entry['keys']] + entry['parts']:
+                os.remove(f'{self.path}/{file}')
+            self.index.remove(entry)
+        self._add_part(method, lang, params, keys, values)
+
+    def entries(self, method=None, lang=None, **params):
+        """Returns the (method, language, parameters) of the results saved,
+        only the ones with the given method, language and parameter values
+        if given."""
+        return [(entry['method'], entry['lang'], entry['params'])
+                for entry in self.index
+                if method in (None, entry['method'])
+                and lang in (None, entry['lang'])
+                and all(entry['params'].get(name) == value
+                        for name, value in params.items())]
+
+    def seeds(self, method, lang, params):
+        """Returns the seeds of the trials appended for method for the
+        language lang with the given parameters (None for the ones appended
+        without their seed), or an empty list if there are none."""
+        entry = self._entry(method, lang, params)
+        if entry is None:
+            return []
+        return entry.get('seeds', [None] * len(entry['parts']))
+
+    def keys(self, method, lang, params):
+        """Returns the keys of the rows of the results of method for the
+        language lang with the given parameters."""
+        entry = self._entry(method, lang, params)
+        if entry is None:
+            raise KeyError((method, lang, params_key(params)))
+        return np.char.decode(np.load(f'{self.path}/{entry["keys"]}'), 'utf-8')
+
+    def load(self, method, lang, params):
+        """Returns the keys and the results of method for the language
+        lang with the given parameters. A result saved in a single part is
+        memory-mapped, and parts saved separately are joined along their
+        last axis."""
+
+        entry = self._entry(method, lang, params)
+        if entry is None:
+            raise KeyError((method, lang, params_key(params)))
+        parts = [np.load(f'{self.path}/{part}', mmap_mode='r')
+                 for part in entry['parts']]
+        values = parts[0] if len(parts) == 1 else np.concatenate(parts, axis=-1)
+        return self.keys(method, lang, params), values
+
+    def load_dict(self, method, lang, params):
+        """Returns the results of method for the language lang with the
+        given parameters as a dict from each key to its result (a number,
+        or a list with one number per trial)."""
+        keys, values = self.load(method, lang, params)
+        return dict(zip(keys.tolist(), np.asarray(values).tolist()))
+
+    def save(self):
+        """Writes the index of the store to its file."""
+        with open(self.index_file, 'w') as f:
+            json.dump(self.index, f, indent=1)
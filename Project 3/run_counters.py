@@ -5,11 +5,40 @@ from counters import *
 from glob import glob
 import pickle
 
+import numpy as np
+
+from result_store import ResultStore
+
 
 BOOK_PATH = './book'
 RESULTS_PATH = './results'
 
 
+def store_results(method, results, params, store=None):
+    """Saves the results of a counter, a dict from each language to the
+    counter with the words and their (estimated) frequency, in the result
+    store, with the most frequent words first, replacing the ones saved."""
+    store = ResultStore() if store is None else store
+    for lang, counter in results.items():
+        words, counts = zip(*counter.most_common()) if counter else ((), ())
+        store.put(method, lang, params, words,
+                  np.array(counts, dtype=np.int64))
+
+
+def convert_results(store=None):
+    """Saves the results saved as pickle files by earlier versions of main
+    in the result store."""
+    store = ResultStore() if store is None else store
+    with open(f'{RESULTS_PATH}/det_counter.pkl', 'rb') as f:
+        store_results('det_counter', pickle.load(f), {}, store)
+    for file in sorted(glob(f'{RESULTS_PATH}/cm_sketch_*.pkl')):
+        m = int(file.split('_')[-2][-5:])
+        d = int(file.split('_')[-1][2:-4])
+        with open(file, 'rb') as f:
+            store_results('cm_sketch', pickle.load(f), {'m': m, 'd': d},
+                          store)
+
+
 def main(funcs=(det_count, cm_sketch), k=3e2, d=5, m=None):
     
     if det_count in funcs:
@@ -22,8 +51,7 @@ def main(funcs=(det_count, cm_sketch), k=3e2, d=5, m=None):
             print(' DONE')
 
         print('ALL DONE.', end=' ')
-        with open(f'{RESULTS_PATH}/det_counter.pkl', 'wb') as f:
-            pickle.dump(det_results, f)
+        store_results('det_counter', det_results, {})
         print('RESULTS SAVED.')
 
     if cm_sketch in funcs:
@@ -40,11 +68,7 @@ def main(funcs=(det_count, cm_sketch), k=3e2, d=5, m=None):
         print(f'CM Sketch with {m} columns and {d} rows')
         print('ALL DONE.', end=' ')
 
-        str_m = str(m).zfill(5)
-        str_d = str(d).zfill(2)
-        fname_desc = f'm={str_m}_d={str_d}'    
-        with open(f'{RESULTS_PATH}/cm_sketch_{fname_desc}.pkl', 'wb', ) as f:
-            pickle.dump(cm_sketch_results, f)
+        store_results('cm_sketch', cm_sketch_results, params)
         print('RESULTS SAVED.')
    
 